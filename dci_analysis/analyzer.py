@@ -14,15 +14,27 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-from datetime import datetime as dt
+import collections
 import glob
-import json
+from datetime import datetime as dt
 import logging
 import os
 import sys
 
+import numpy
 import pandas as pd
 
+from dci_analysis import cache
+from dci_analysis import compact
+from dci_analysis import loader
+from dci_analysis import manifest
+from dci_analysis import results_cache
+from dci_analysis import rollups
+from dci_analysis import sqlite_store
+from dci_analysis import stability
+from dci_analysis import store
+from dci_analysis import tags_index
+from dci_analysis import tags_log
 
 LOG = logging.getLogger(__name__)
 
@@ -37,6 +49,23 @@ WORKING_DIR = os.getenv(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
 )
 
+# compute the baselines from the daily rollups of the topics when possible
+USE_ROLLUPS = os.getenv("DCI_ANALYSIS_ROLLUPS", "1") != "0"
+# the medians and percentiles of the rollups are approximate, they are only
+# used as baselines when enabled
+APPROXIMATE_ROLLUPS = os.getenv("DCI_ANALYSIS_APPROXIMATE_ROLLUPS", "") not in ("", "0")
+
+# process wide cache of the loaded topics datasets, its size is in MB
+DATASETS_CACHE = cache.LRUCache(
+    int(os.getenv("DCI_ANALYSIS_CACHE_SIZE", 512)) * 1024 * 1024
+)
+
+# process wide cache of the comparisons results, the dashboard tables read
+# their pages from it, its size is in MB
+RESULTS_CACHE = cache.LRUCache(
+    int(os.getenv("DCI_ANALYSIS_RESULTS_CACHE_SIZE", 64)) * 1024 * 1024
+)
+
 
 def string_to_date(date):
     if "T" in date:
@@ -44,105 +73,314 @@ def string_to_date(date):
     return dt.strptime(date, "%Y-%m-%d")
 
 
-def get_sorted_csv_files(csv_files, topic_name):
-    sorted_csv_files = []
-    for cf in csv_files:
-        cf = cf.split("/")[-1]
-        date, file_name = cf.split("_", 1)
-        sorted_csv_files.append({"date": date, "file_name": file_name})
-    sorted_csv_files.sort(key=lambda a: dt.strptime(a["date"], "%Y-%m-%d"))  # noqa
-    return [
-        "%s/%s_%s" % (topic_name, scf["date"], scf["file_name"])
-        for scf in sorted_csv_files
-    ]  # noqa
-
-
-def get_files_between_start_and_end_date(csv_files, start_date, end_date):
-    files = []
-    for cf in csv_files:
-        date = cf.split("/")[-1].split("_")[0]
-        date = string_to_date(date)
-        if date >= start_date and date <= end_date:
-            files.append(cf)
-    return files
+def get_tagged_jobs(topic_name, tags):
+    """Return the set of the job files of the topic matching the tags
+    expression, see tags_index for its syntax."""
+    return tags_index.load(WORKING_DIR, topic_name).match(tags)
 
 
 def filter_by_tags(jobs, topic_name, tags):
-    result_jobs = []
     if not tags:
         return jobs
-    not_tags = set()
-    in_tags = set()
-    for t in tags:
-        if t.startswith("!"):
-            not_tags.add(t[1:])
-        else:
-            in_tags.add(t)
-    with open("%s/%s/index_tags.json" % (WORKING_DIR, topic_name), "r") as f:
-        index_tags = f.read()
-        index_tags = json.loads(index_tags)
-        for job in jobs:
-            job = os.path.basename(job)
-            if job in index_tags:
-                if not_tags and not_tags.issubset(set(index_tags[job])):
-                    continue
-                if in_tags.issubset(set(index_tags[job])):
-                    result_jobs.append(job)
-    return result_jobs
+    tagged_jobs = get_tagged_jobs(topic_name, tags)
+    return [
+        os.path.basename(job) for job in jobs if os.path.basename(job) in tagged_jobs
+    ]
+
+
+def get_jobs_dataset_from_store(
+    topic_name, store_jobs, start_date, end_date, tags, latest_job=False
+):
+    # the dates and tags predicates are applied on the jobs metadata so that
+    # only the selected columns are read from the store
+    start_date = start_date.strftime("%Y-%m-%d")
+    end_date = end_date.strftime("%Y-%m-%d")
+    tagged_jobs = get_tagged_jobs(topic_name, tags) if tags else None
+    jobs_indexes = []
+    for i, job in enumerate(store_jobs):
+        if job["date"] < start_date or job["date"] > end_date:
+            continue
+        if tagged_jobs is not None and job["file"] not in tagged_jobs:
+            continue
+        jobs_indexes.append(i)
+
+    if not jobs_indexes:
+        return None, []
+    if latest_job is True:
+        jobs_indexes = jobs_indexes[-1:]
+
+    jobs_dataset = store.read_jobs(WORKING_DIR, topic_name, jobs_indexes)
+    jobs_ids_dates = [
+        {"date": store_jobs[i]["date"], "id": store_jobs[i]["id"]} for i in jobs_indexes
+    ]
+    return jobs_dataset, jobs_ids_dates
+
+
+def _get_topic_signature(topic_name):
+    # a sync adds files to the topic directory and rewrites the tags index
+    # and the store, any of them changing invalidates the cached datasets
+    signature = []
+    for path in (
+        "%s/%s" % (WORKING_DIR, topic_name),
+        tags_log.get_index_tags_path(WORKING_DIR, topic_name),
+        tags_log.get_tags_log_path(WORKING_DIR, topic_name),
+        "%s/jobs.json" % store.get_store_path(WORKING_DIR, topic_name),
+        tags_index.get_tags_index_path(WORKING_DIR, topic_name),
+    ):
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_min_max_dates(topic_name):
+    """Return the dates of the oldest and the newest jobs of the topic."""
+    min_date, max_date = manifest.load(WORKING_DIR, topic_name).min_max_dates()
+    if min_date is None:
+        return None, None
+    return string_to_date(min_date), string_to_date(max_date)
+
+
+def get_cache_stats():
+    return DATASETS_CACHE.stats()
+
+
+def get_test_history(topic_name, testname, start_date=None, end_date=None):
+    """Return the timings of the test in the jobs of the topic created
+    between the dates, a DataFrame of the id, created_at and time of the
+    jobs sorted by date.
+
+    The selection is done by the sqlite store when it is up to date with
+    the topic, otherwise the test row is read from the columnar store.
+    """
+    columns = ["id", "created_at", "time"]
+    if sqlite_store.is_fresh(WORKING_DIR, topic_name):
+        rows = sqlite_store.get_test_history(
+            WORKING_DIR, topic_name, testname, start_date, end_date
+        )
+        return pd.DataFrame(rows, columns=columns)
+
+    store_jobs = store.get_jobs(WORKING_DIR, topic_name)
+    timings = None
+    if store_jobs is not None:
+        timings = store.read_test(WORKING_DIR, topic_name, testname)
+    if timings is None or len(timings) != len(store_jobs):
+        return pd.DataFrame([], columns=columns)
+    start = start_date.strftime("%Y-%m-%d") if start_date else ""
+    end = end_date.strftime("%Y-%m-%d") if end_date else "9999"
+    rows = [
+        (job["id"], job["date"], time)
+        for job, time in zip(store_jobs, timings)
+        if start <= job["date"] <= end and not numpy.isnan(time)
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def get_topics():
+    """Return the names of the synced topics of the working directory."""
+    return sorted(
+        os.path.basename(os.path.dirname(p))
+        for p in glob.glob("%s/*/%s" % (WORKING_DIR, store.STORE_DIR))
+    )
+
+
+def get_topic_tests(topic_name):
+    """Return the sorted test names of the topic store."""
+    if store.get_jobs(WORKING_DIR, topic_name) is None:
+        return []
+    return sorted(store.get_tests_positions(WORKING_DIR, topic_name))
+
+
+def get_job_timings(topic_name, job_id):
+    """Return the Series of the timings of the tests of the job."""
+    store_jobs = store.get_jobs(WORKING_DIR, topic_name) or []
+    for i, job in enumerate(store_jobs):
+        if job["id"] == job_id:
+            return store.read_job(WORKING_DIR, topic_name, i)
+    return None
+
+
+def get_jobs_with_tag(topic_name, tag, start_date=None, end_date=None):
+    """Return the id and created_at of the jobs of the topic having the tag
+    and created between the dates, sorted by date."""
+    if sqlite_store.is_fresh(WORKING_DIR, topic_name):
+        rows = sqlite_store.get_jobs_with_tag(
+            WORKING_DIR, topic_name, tag, start_date, end_date
+        )
+        return [{"id": job_id, "created_at": created_at} for job_id, created_at in rows]
+
+    topic_manifest = manifest.load(WORKING_DIR, topic_name)
+    min_date, max_date = topic_manifest.min_max_dates()
+    if min_date is None:
+        return []
+    jobs = topic_manifest.between(
+        start_date or string_to_date(min_date), end_date or string_to_date(max_date)
+    )
+    return [
+        {"id": job["id"], "created_at": job["created_at"]}
+        for job in jobs
+        if tag in job["tags"]
+    ]
 
 
 def get_jobs_dataset(
     topic_name, start_date, end_date, tags, latest_job=False, filtered_tests=None
 ):
-    LOG.info("get files files from %s/%s" % (WORKING_DIR, topic_name))
-    csv_files = glob.glob("%s/%s/*.csv" % (WORKING_DIR, topic_name))
-    csv_files = filter_by_tags(csv_files, topic_name, tags)
-    sorted_csv_files = get_sorted_csv_files(csv_files, topic_name)
-    sorted_csv_files = get_files_between_start_and_end_date(
-        sorted_csv_files, start_date, end_date
+    # the cached dataset is not filtered, dropping the filtered tests is
+    # cheap and lets every filtering of a topic share the same entry
+    key = (
+        WORKING_DIR,
+        topic_name,
+        start_date,
+        end_date,
+        tuple(tags) if tags else None,
+        latest_job,
+        compact.ENABLED,
     )
+    signature = _get_topic_signature(topic_name)
+    cached = DATASETS_CACHE.get(key, signature)
+    if cached is None:
+        cached = _load_jobs_dataset(topic_name, start_date, end_date, tags, latest_job)
+        if compact.ENABLED and cached[0] is not None:
+            cached = (compact.compact(cached[0]), cached[1])
+        nbytes = 0
+        if cached[0] is not None:
+            nbytes = int(cached[0].memory_usage(deep=True).sum())
+        DATASETS_CACHE.put(key, cached, nbytes, signature)
+
+    jobs_dataset, jobs_ids_dates = cached
+    if jobs_dataset is None:
+        return None, []
+    if filtered_tests:
+        if compact.is_compact(jobs_dataset):
+            filtered_tests = compact.encode(filtered_tests)
+        jobs_dataset = jobs_dataset.drop(filtered_tests, errors="ignore")
+    else:
+        jobs_dataset = jobs_dataset.copy()
+    return jobs_dataset, [dict(jid) for jid in jobs_ids_dates]
+
+
+def _load_jobs_dataset(topic_name, start_date, end_date, tags, latest_job=False):
+    store_jobs = store.get_jobs(WORKING_DIR, topic_name)
+    if store_jobs is not None:
+        LOG.info("get jobs from %s/%s store" % (WORKING_DIR, topic_name))
+        jobs_dataset, jobs_ids_dates = get_jobs_dataset_from_store(
+            topic_name, store_jobs, start_date, end_date, tags, latest_job
+        )
+        # an unreadable store falls back to the csv files
+        if jobs_dataset is not None or not jobs_ids_dates:
+            return jobs_dataset, jobs_ids_dates
+
+    LOG.info("get files files from %s/%s" % (WORKING_DIR, topic_name))
+    topic_manifest = manifest.load(WORKING_DIR, topic_name)
+    manifest_jobs = topic_manifest.between(start_date, end_date)
+    if tags:
+        tagged_jobs = get_tagged_jobs(topic_name, tags)
+        manifest_jobs = [j for j in manifest_jobs if j["file"] in tagged_jobs]
+    sorted_csv_files = ["%s/%s" % (topic_name, j["file"]) for j in manifest_jobs]
 
     if not sorted_csv_files:
         return None, []
     if latest_job is True:
         sorted_csv_files = sorted_csv_files[-1:]
 
-    jobs_ids_dates = []
-    # get first file to start pandas joins with
-    first_csf_file = sorted_csv_files[0]
-    csv_files = []
-    if len(sorted_csv_files) > 1:
-        csv_files = sorted_csv_files[1:]
-    abs_path_cf = os.path.abspath("%s/%s" % (WORKING_DIR, first_csf_file))
-    jobs_ids_dates.append(
-        {
-            "date": first_csf_file.split("/")[1].split("_", 1)[0],
-            "id": first_csf_file.split("/")[1].split("_")[1],
-        }
-    )
-    jobs_dataset = pd.read_csv(
-        abs_path_cf, delimiter=",", engine="python", index_col="testname"
-    )  # noqa
+    abs_path_csv_files = [
+        os.path.abspath("%s/%s" % (WORKING_DIR, cf)) for cf in sorted_csv_files
+    ]
+    jobs_dataset, loaded_files, _ = loader.read_csv_files(abs_path_csv_files)
+    if jobs_dataset is None:
+        return None, []
 
-    for cf in csv_files:
-        abs_path_cf = os.path.abspath("%s/%s" % (WORKING_DIR, cf))
+    jobs_ids_dates = []
+    for cf in loaded_files:
+        file_name = os.path.basename(cf)
         jobs_ids_dates.append(
-            {
-                "date": cf.split("/")[1].split("_", 1)[0],
-                "id": cf.split("/")[1].split("_")[1],
-            }
+            {"date": file_name.split("_", 1)[0], "id": file_name.split("_")[1]}
         )
-        df = pd.read_csv(
-            abs_path_cf, delimiter=",", engine="python", index_col="testname"
-        )  # noqa
-        jobs_dataset = jobs_dataset.merge(df, left_on="testname", right_on="testname")
 
-    if filtered_tests:
-        jobs_dataset = jobs_dataset.drop(filtered_tests)
     return jobs_dataset, jobs_ids_dates
 
 
-def comparison_with_mean(
+def get_baseline(jobs, statistic="mean", trim=0.1):
+    """Reduce the jobs of the baseline topic to one value per test.
+
+    statistic is "mean", "median", "trimmed_mean" (trim is the proportion
+    cut at each end) or a float quantile between 0 and 1.
+    """
+    if statistic == "mean":
+        return jobs.mean(axis=1)
+    elif statistic == "median":
+        return jobs.median(axis=1)
+    elif statistic == "trimmed_mean":
+        values = numpy.sort(jobs.to_numpy(dtype=float), axis=1)
+        nb_trimmed = int(values.shape[1] * trim)
+        values = values[:, nb_trimmed : values.shape[1] - nb_trimmed]
+        return pd.Series(values.mean(axis=1), index=jobs.index)
+    elif isinstance(statistic, float):
+        return jobs.quantile(statistic, axis=1)
+    raise ValueError("unknown baseline statistic %s" % statistic)
+
+
+def reduce_jobs(jobs, computation=None):
+    """Reduce the jobs of the compared topic, computation is None or "all"
+    to keep every job, "latest", "mean" or "median"."""
+    if computation is None or computation == "all":
+        return jobs
+    elif computation == "latest":
+        return jobs.iloc[:, -1:]
+    elif computation == "median":
+        return jobs.median(axis=1).to_frame()
+    elif computation == "mean":
+        return jobs.mean(axis=1).to_frame()
+    raise ValueError("unknown computation %s" % computation)
+
+
+def get_baseline_from_rollups(topic_name, start_date, end_date, tags, statistic):
+    """Return the baseline statistic of each test composed from the daily
+    rollups of the topic, or None if they are disabled, missing, stale or
+    do not support the statistic.
+
+    The means are exact, the medians and quantiles come from the rollups
+    sketches, within rollups.SKETCH_ACCURACY of a timing, they are only
+    used with APPROXIMATE_ROLLUPS.
+    """
+    if not USE_ROLLUPS:
+        return None
+    if statistic != "mean" and not APPROXIMATE_ROLLUPS:
+        return None
+    if statistic not in ("mean", "median") and not isinstance(statistic, float):
+        return None
+    aggregate = rollups.aggregate(WORKING_DIR, topic_name, start_date, end_date, tags)
+    if aggregate is None:
+        return None
+    LOG.info("%s baseline of %s from its rollups" % (statistic, topic_name))
+    if statistic == "mean":
+        return aggregate.mean()
+    return aggregate.quantile(0.5 if statistic == "median" else statistic)
+
+
+def compare_jobs(
+    baseline_jobs, jobs, baseline_statistic="mean", computation=None, baseline=None
+):
+    """Compute the delta in percentage of each job of the compared topic
+    with the baseline statistic of each test, or with the given baseline
+    Series of the tests.
+
+    The tests missing from the baseline have a NaN delta.
+    """
+    if baseline is None:
+        baseline = get_baseline(baseline_jobs, baseline_statistic)
+    elif compact.is_compact(jobs):
+        baseline = compact.encode_index(baseline)
+    jobs = reduce_jobs(jobs, computation)
+    baseline = baseline.reindex(jobs.index).to_numpy(dtype=float)[:, numpy.newaxis]
+    deltas = (jobs.to_numpy(dtype=float) - baseline) * 100.0 / baseline
+    return pd.DataFrame(deltas, index=jobs.index, columns=jobs.columns)
+
+
+def comparison_with(
+    baseline_statistic,
     topic_name_1,
     topic_name_2,
     topic_1_start_date,
@@ -154,71 +392,242 @@ def comparison_with_mean(
     topic2_computation=None,
     filtered_tests=None,
 ):
-    # compare against topic_1's mean
     LOG.info(
-        "compare the mean of topic %s with jobs of topic %s..."
-        % (topic_name_1, topic_name_2)
-    )  # noqa
-    topic_1_jobs, _ = get_jobs_dataset(
+        "compare the %s of topic %s with jobs of topic %s..."
+        % (baseline_statistic, topic_name_1, topic_name_2)
+    )
+    # the jobs of topic 1 are only loaded without usable rollups
+    topic_1_jobs = None
+    baseline = get_baseline_from_rollups(
         topic_name_1,
         topic_1_start_date,
         topic_1_end_date,
         topic_1_tags,
-        filtered_tests=filtered_tests,
+        baseline_statistic,
     )
-    topic_1_jobs_mean = topic_1_jobs.mean(axis=1)
-
-    jobs = None
-    jobs_ids_dates = None
-    if topic2_computation is None:
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
-        )
-    elif topic2_computation == "latest":
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            True,
-            filtered_tests,
-        )
-    elif topic2_computation == "median":
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
+    if baseline is not None and filtered_tests:
+        baseline = baseline.drop(
+            list(compact.decode_tests(filtered_tests)), errors="ignore"
         )
-        jobs = jobs.median(axis=1).to_frame()
-    elif topic2_computation == "mean":
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
+    if baseline is None:
+        topic_1_jobs, _ = get_jobs_dataset(
+            topic_name_1,
+            topic_1_start_date,
+            topic_1_end_date,
+            topic_1_tags,
+            filtered_tests=filtered_tests,
         )
-        jobs = jobs.mean(axis=1).to_frame()
+    # the latest job is read alone to keep all of its tests
+    latest_job = topic2_computation == "latest"
+    jobs, jobs_ids_dates = get_jobs_dataset(
+        topic_name_2,
+        topic_2_start_date,
+        topic_2_end_date,
+        topic_2_tags,
+        latest_job,
+        filtered_tests,
+    )
+    if latest_job:
+        topic2_computation = None
+    compared_jobs = compare_jobs(
+        topic_1_jobs, jobs, baseline_statistic, topic2_computation, baseline
+    )
+    return compact.decode(compared_jobs), jobs_ids_dates
+
+
+def comparison_with_mean(*args, **kwargs):
+    # compare against topic_1's mean
+    return comparison_with("mean", *args, **kwargs)
+
+
+def comparison_with_median(*args, **kwargs):
+    # compare against topic_1's median
+    return comparison_with("median", *args, **kwargs)
+
+
+def get_coefficient_variation(jobs, threshold=None):
+    coeff_var = jobs.std(axis=1, ddof=0) / jobs.mean(axis=1)
+    coeff_var = coeff_var.sort_values(ascending=False)
+    if threshold:
+        coeff_var = coeff_var[coeff_var <= threshold]
+    return coeff_var
+
+
+def get_topic_coefficient_variation(topic_name, start_date, end_date, tags):
+    """Return the coefficient of variation of the tests of the topic from
+    its stability profile, or None if there is no fresh profile or if the
+    dates do not cover all the jobs of the topic."""
+    profile = stability.load(WORKING_DIR, topic_name)
+    store_jobs = store.get_jobs(WORKING_DIR, topic_name)
+    if profile is None or not store_jobs:
+        return None
+    if (
+        start_date.strftime("%Y-%m-%d") > store_jobs[0]["date"]
+        or end_date.strftime("%Y-%m-%d") < store_jobs[-1]["date"]
+    ):
+        return None
+    tags_keys = list(profile.tags)
+    if tags:
+        tags_keys = tags_index.TagsIndex.from_jobs_tags(profile.tags).match(tags)
+    return profile.get_coefficient_variation(tags_keys)
+
+
+def _get_coefficient_variation(topic_name, start_date, end_date, tags, jobs):
+    coeff_var = get_topic_coefficient_variation(topic_name, start_date, end_date, tags)
+    if coeff_var is None:
+        return get_coefficient_variation(jobs)
+    LOG.info("coefficients of variation of %s from its profile" % topic_name)
+    coeff_var = coeff_var.sort_values(ascending=False)
+    if compact.is_compact(jobs):
+        coeff_var = compact.encode_index(coeff_var)
+    return coeff_var
+
+
+def get_coefficient_variations(topic_name, start_date, end_date, tags, threshold):
+    """Return the coefficients of variation of the tests of the topic not
+    above the threshold, from its profile or from its cached jobs, or None
+    if the topic has no jobs. The comparison is not computed."""
+    coeff_var = get_topic_coefficient_variation(topic_name, start_date, end_date, tags)
+    if coeff_var is None:
+        jobs, _ = get_jobs_dataset(topic_name, start_date, end_date, tags)
+        if jobs is None:
+            return None
+        coeff_var = compact.decode(get_coefficient_variation(jobs))
+    coeff_var = coeff_var.sort_values(ascending=False)
+    if threshold:
+        coeff_var = coeff_var[coeff_var <= threshold]
+    return coeff_var
 
-    def delta_mean(lign):
-        if lign.name not in topic_1_jobs.index.values:
-            return "N/A"
-        diff = lign - topic_1_jobs_mean[lign.name]
-        return (diff * 100.0) / topic_1_jobs_mean[lign.name]
 
-    return jobs.apply(delta_mean, axis=1), jobs_ids_dates
+def get_sum_per_class(jobs):
+    if compact.is_compact(jobs):
+        return compact.sum_per_class(jobs)
+    classes = [testname.split("/")[0] for testname in jobs.index]
+    return jobs.groupby(pd.Index(classes, name="class")).sum()
 
 
-def comparison_with_median(
+def get_numeric_values(data):
+    """Return the float matrix of the values of the DataFrame, the values of
+    its non numeric columns which are not numbers, like "N/A", are NaN."""
+    numeric = numpy.array(
+        [pd.api.types.is_numeric_dtype(dtype) for dtype in data.dtypes], dtype=bool
+    )
+    if numeric.all():
+        return data.to_numpy(dtype=float)
+    # only the non numeric columns are converted
+    values = numpy.empty(data.shape)
+    values[:, numeric] = data.iloc[:, numeric].to_numpy(dtype=float)
+    values[:, ~numeric] = (
+        data.iloc[:, ~numeric]
+        .apply(pd.to_numeric, errors="coerce")
+        .to_numpy(dtype=float)
+    )
+    return values
+
+
+def get_trends(compared_jobs, evolution_percentages):
+    """Compute the given percentiles of the deltas of every job at once.
+
+    The deltas of each job are sorted once, each percentile is then a
+    single indexing of the sorted matrix. NaN and "N/A" deltas are
+    ignored.
+
+    Return a DataFrame with one row per percentile and one column per job.
+    """
+    values = get_numeric_values(compared_jobs)
+    # NaN are sorted last, the rank of a percentile only counts the deltas
+    values = numpy.sort(values, axis=0)
+    nb_values = numpy.count_nonzero(~numpy.isnan(values), axis=0)
+    percentages = numpy.asarray(evolution_percentages, dtype=float) / 100.0
+    indexes = numpy.floor(numpy.outer(percentages, nb_values)).astype(int)
+    indexes = numpy.minimum(indexes, numpy.maximum(nb_values - 1, 0))
+    trends = numpy.take_along_axis(values, indexes, axis=0)
+    trends[:, nb_values == 0] = numpy.nan
+    return pd.DataFrame(
+        trends, index=list(evolution_percentages), columns=compared_jobs.columns
+    )
+
+
+def get_trend_values(compared_jobs, evolution_percentage):
+    return get_trends(compared_jobs, [evolution_percentage]).iloc[0].tolist()
+
+
+DeltasHistogram = collections.namedtuple(
+    "DeltasHistogram", ["intervals", "counts", "testcases"]
+)
+
+
+def get_deltas_histogram(compared_jobs, bins=25, adaptive=False):
+    """Count the deltas of compared_jobs per interval.
+
+    The fixed intervals have the same integer width, the adaptive ones
+    are the quantiles of the deltas so that each interval holds about the
+    same number of deltas. NaN and "N/A" deltas are not counted.
+
+    Return a DeltasHistogram with the (low, high) intervals, the number
+    of deltas in each of them and the sorted names of their testcases.
+    """
+    values = get_numeric_values(compared_jobs)
+    rows = numpy.nonzero(~numpy.isnan(values))[0]
+    values = values[~numpy.isnan(values)]
+    if values.size == 0:
+        return DeltasHistogram([], [], [])
+
+    if adaptive:
+        edges = numpy.unique(numpy.quantile(values, numpy.linspace(0, 1, bins + 1)))
+        if edges.size == 1:
+            edges = numpy.array([edges[0], edges[0] + 1.0])
+        intervals = list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+        # the last interval includes the maximum delta
+        bins_idx = numpy.searchsorted(edges, values, side="right") - 1
+        bins_idx[bins_idx == len(intervals)] = len(intervals) - 1
+    else:
+        low = int(values.min() - 1.0)
+        high = int(values.max() + 1.0)
+        interval = int((high - low) / float(bins)) or 1
+        intervals = [(i, i + interval) for i in range(low, high, interval)]
+        bins_idx = numpy.floor((values - low) / interval).astype(int)
+
+    in_intervals = (bins_idx >= 0) & (bins_idx < len(intervals))
+    bins_idx = bins_idx[in_intervals]
+    rows = rows[in_intervals]
+    counts = numpy.bincount(bins_idx, minlength=len(intervals))
+
+    # the (interval, testcase) pairs having deltas, the testcases are
+    # taken in the order of their names
+    nb_rows = compared_jobs.shape[0]
+    pairs = numpy.bincount(
+        bins_idx.astype(numpy.int64) * nb_rows + rows,
+        minlength=len(intervals) * nb_rows,
+    ).reshape(len(intervals), nb_rows)
+    testnames = compared_jobs.index.to_numpy()
+    order = numpy.argsort(testnames, kind="stable")
+    sorted_testnames = testnames[order]
+    testcases = [
+        sorted_testnames[pairs[i, order] > 0].tolist() for i in range(len(intervals))
+    ]
+    return DeltasHistogram(intervals, counts.tolist(), testcases)
+
+
+ComparisonResult = collections.namedtuple(
+    "ComparisonResult",
+    [
+        "coeff_var_1",
+        "coeff_var_2",
+        "filtered_tests",
+        "compared_jobs",
+        "jobs_ids_dates",
+        "histogram",
+        "compared_all_jobs",
+        "all_jobs_ids_dates",
+        "sum_per_class_1",
+        "sum_per_class_2",
+        "trends",
+    ],
+)
+
+
+def compare_topics(
     topic_name_1,
     topic_name_2,
     topic_1_start_date,
@@ -227,36 +636,50 @@ def comparison_with_median(
     topic_2_end_date,
     topic_1_tags,
     topic_2_tags,
-    topic2_computation=None,
-    filtered_tests=None,
+    topic1_computation,
+    topic2_computation,
+    cov_threshold,
+    evolution_percentages,
+    histogram_bins=25,
+    adaptive_histogram=False,
 ):
-    # compare against topic_1's median
+    """Compute everything the dashboard shows for a comparison of two
+    topics, each topic is loaded once and every result is derived from
+    the in-memory datasets.
+
+    Return a ComparisonResult or None if a topic has no jobs.
+    """
     LOG.info(
-        "compare the median of topic %s with jobs of topic %s..."
-        % (topic_name_1, topic_name_2)
-    )  # noqa
+        "compare the %s of topic %s with jobs of topic %s..."
+        % (topic1_computation, topic_name_1, topic_name_2)
+    )
     topic_1_jobs, _ = get_jobs_dataset(
-        topic_name_1,
-        topic_1_start_date,
-        topic_1_end_date,
-        topic_1_tags,
-        filtered_tests=filtered_tests,
+        topic_name_1, topic_1_start_date, topic_1_end_date, topic_1_tags
+    )
+    topic_2_jobs, topic_2_jobs_ids_dates = get_jobs_dataset(
+        topic_name_2, topic_2_start_date, topic_2_end_date, topic_2_tags
     )
-    print("shape topic 1 jobs: %s,%s" % topic_1_jobs.shape)
-    topic_1_jobs_median = topic_1_jobs.median(axis=1)
+    if topic_1_jobs is None or topic_2_jobs is None:
+        return None
 
-    jobs = None
-    jobs_ids_dates = None
-    if topic2_computation is None:
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
-        )
-    elif topic2_computation == "latest":
+    # the tests which vary too much in topic 1 are filtered from both topics,
+    # the coefficients of variation come from the stability profiles when
+    # the dates cover the whole topics
+    coeff_var_1 = _get_coefficient_variation(
+        topic_name_1, topic_1_start_date, topic_1_end_date, topic_1_tags, topic_1_jobs
+    )
+    coeff_var_2 = _get_coefficient_variation(
+        topic_name_2, topic_2_start_date, topic_2_end_date, topic_2_tags, topic_2_jobs
+    )
+    filtered_tests = set(coeff_var_1[coeff_var_1 > cov_threshold].index)
+    if cov_threshold:
+        coeff_var_1 = coeff_var_1[coeff_var_1 <= cov_threshold]
+        coeff_var_2 = coeff_var_2[coeff_var_2 <= cov_threshold]
+
+    topic_1_jobs = topic_1_jobs.drop(filtered_tests, errors="ignore")
+    topic_2_jobs = topic_2_jobs.drop(filtered_tests, errors="ignore")
+
+    if topic2_computation == "latest":
         jobs, jobs_ids_dates = get_jobs_dataset(
             topic_name_2,
             topic_2_start_date,
@@ -265,33 +688,75 @@ def comparison_with_median(
             True,
             filtered_tests,
         )
-    elif topic2_computation == "median":
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
-        )
-        jobs = jobs.median(axis=1).to_frame()
-    elif topic2_computation == "mean":
-        jobs, jobs_ids_dates = get_jobs_dataset(
-            topic_name_2,
-            topic_2_start_date,
-            topic_2_end_date,
-            topic_2_tags,
-            False,
-            filtered_tests,
+    else:
+        jobs = reduce_jobs(topic_2_jobs, topic2_computation)
+        jobs_ids_dates = topic_2_jobs_ids_dates
+    # the baseline comes from the rollups when they support it, the jobs of
+    # topic 1 are still needed for the sum per class
+    baseline = get_baseline_from_rollups(
+        topic_name_1,
+        topic_1_start_date,
+        topic_1_end_date,
+        topic_1_tags,
+        topic1_computation,
+    )
+    if baseline is not None:
+        baseline = baseline.drop(
+            list(compact.decode_tests(filtered_tests)), errors="ignore"
         )
-        jobs = jobs.mean(axis=1).to_frame()
+    else:
+        baseline = get_baseline(topic_1_jobs, topic1_computation)
 
-    print("shape topic_2 jobs: %s,%s" % jobs.shape)
-    print("topic_2 jobs type %s" % str(type(jobs)))
+    # the compact test ids are decoded in the results only
+    compared_jobs = compact.decode(
+        compare_jobs(None, jobs, topic1_computation, baseline=baseline)
+    )
+    compared_all_jobs = compact.decode(
+        compare_jobs(None, topic_2_jobs, topic1_computation, baseline=baseline)
+    )
+
+    return ComparisonResult(
+        coeff_var_1=compact.decode(coeff_var_1),
+        coeff_var_2=compact.decode(coeff_var_2),
+        filtered_tests=compact.decode_tests(filtered_tests),
+        compared_jobs=compared_jobs,
+        jobs_ids_dates=jobs_ids_dates,
+        histogram=get_deltas_histogram(
+            compared_jobs, histogram_bins, adaptive_histogram
+        ),
+        compared_all_jobs=compared_all_jobs,
+        all_jobs_ids_dates=topic_2_jobs_ids_dates,
+        sum_per_class_1=get_sum_per_class(topic_1_jobs),
+        sum_per_class_2=get_sum_per_class(topic_2_jobs),
+        trends=get_trends(compared_all_jobs, evolution_percentages),
+    )
 
-    def delta_median(lign):
-        if lign.name in topic_1_jobs.index.values:
-            diff = lign - topic_1_jobs_median[lign.name]
-            return (diff * 100.0) / topic_1_jobs_median[lign.name]
 
-    return jobs.apply(delta_median, axis=1), jobs_ids_dates
+def get_comparison(topic_name_1, topic_name_2, *args):
+    """Return the compare_topics result of the arguments, read from the
+    results shared by the dashboard workers or computed once on a miss."""
+    key = (WORKING_DIR, topic_name_1, topic_name_2, repr(args))
+    signature = (
+        _get_topic_signature(topic_name_1),
+        _get_topic_signature(topic_name_2),
+        compact.ENABLED,
+        USE_ROLLUPS,
+        APPROXIMATE_ROLLUPS,
+    )
+    result = RESULTS_CACHE.get(key, signature)
+    if result is None:
+        digest = results_cache.get_digest(key, signature)
+        with results_cache.Lock(WORKING_DIR, digest):
+            result = results_cache.load(WORKING_DIR, digest)
+            if result is None:
+                result = compare_topics(topic_name_1, topic_name_2, *args)
+                if result is None:
+                    return None
+                results_cache.save(WORKING_DIR, digest, result)
+        nbytes = sum(
+            int(numpy.sum(v.memory_usage(deep=True)))
+            for v in result
+            if isinstance(v, (pd.DataFrame, pd.Series))
+        )
+        RESULTS_CACHE.put(key, result, nbytes, signature)
+    return result
@@ -7,14 +7,22 @@ from plotly.subplots import make_subplots
 from datetime import timedelta
 
 from dci_analysis import analyzer
-import numpy
+from dci_analysis import downsampling
+from dci_analysis import tables
 
-import glob
 import os
 
 
+# classes plotted by default in the graphs per class
+DEFAULT_CLASSES = 4
+# height in pixels of the graph of a class
+CLASS_GRAPH_HEIGHT = 300
+
 dashboard = dash.Dash(__name__, suppress_callback_exceptions=True)
 
+# the WSGI application, served by the serve command
+server = dashboard.server
+
 dashboard.layout = html.Div(
     id="container_0",
     children=[
@@ -127,7 +135,7 @@ def display_page(pathname):
                                     value="median",
                                 ),
                                 html.Br(),
-                                html.Label("Evolution percentage"),
+                                html.Label("Evolution percentages (comma separated)"),
                                 dcc.Input(
                                     id="evolution_percentage_value",
                                     value="95",
@@ -230,6 +238,7 @@ def display_page(pathname):
                 html.Div(
                     id="container_5",
                     children=[
+                        dcc.Store(id="comparison_params"),
                         html.Br(),
                         html.Div(id="comparison"),
                         html.Br(),
@@ -256,6 +265,26 @@ def display_page(pathname):
                 ),
             ],
         )
+    elif pathname == "/jobs-details":
+        return html.Div(
+            id="container_6",
+            children=[
+                html.Label("Topic"),
+                dcc.Dropdown(
+                    id="details_topic",
+                    options=[{"label": t, "value": t} for t in analyzer.get_topics()],
+                ),
+                html.Br(),
+                html.Label("Test"),
+                dcc.Dropdown(id="details_testname"),
+                html.Br(),
+                html.H3("Test history"),
+                html.Div(id="details_test_history"),
+                html.Br(),
+                html.H3("Job details"),
+                html.Div(id="details_job"),
+            ],
+        )
     else:
         return html.Div([html.H3("You are on page {}".format(pathname))])
 
@@ -270,6 +299,7 @@ def display_page(pathname):
         dash.dependencies.Output("graph_per_class_2", "children"),
         dash.dependencies.Output("trend", "children"),
         dash.dependencies.Output("trend_jobs_details", "children"),
+        dash.dependencies.Output("comparison_params", "data"),
     ],
     [
         dash.dependencies.Input("submit-button-comparison", "n_clicks"),
@@ -280,9 +310,11 @@ def display_page(pathname):
         dash.dependencies.Input("topic_1_tags", "value"),
         dash.dependencies.Input("topic_2_tags", "value"),
         dash.dependencies.Input("evolution_percentage_value", "value"),
-        dash.dependencies.Input("cov_filtration", "value"),
     ],
     [
+        # the CoV threshold only refreshes the coefficients of variation
+        # tables, it is applied to the comparison on the next computation
+        dash.dependencies.State("cov_filtration", "value"),
         dash.dependencies.State("dropdown_topic_1", "value"),
         dash.dependencies.State("topic_1_computation", "value"),
         dash.dependencies.State("dropdown_topic_2", "value"),
@@ -314,145 +346,44 @@ def update_output(
             "Topic 2 / Sum Graph per class",
             "Trend of the view between topics !",
             "Trends jobs details",
+            None,
         )
     else:
-
-        cov_filtration = float(cov_filtration)
-        topic_1_start_date = analyzer.string_to_date(topic_1_start_date)
-        topic_1_end_date = analyzer.string_to_date(topic_1_end_date) - timedelta(days=1)
-        topic_2_start_date = analyzer.string_to_date(topic_2_start_date)
-        topic_2_end_date = analyzer.string_to_date(topic_2_end_date) - timedelta(days=1)
-
-        if topic_1_tags:
-            topic_1_tags = topic_1_tags.split(",")
-        if topic_2_tags:
-            topic_2_tags = topic_2_tags.split(",")
-
-        def _filter_tests_by_cov(tests, threshold):
-            filtered_tests = set()
-            for test in tests:
-                if test["value"] > threshold:
-                    filtered_tests.add(test["testcase"])
-            return filtered_tests
-
-        # Coefficient of Variation data table
-        def get_coefficient_variation_table(
-            topic_name, topic_2_start_date, topic_2_end_date, topic_tags, threshold=None
-        ):
-            jobs, _ = analyzer.get_jobs_dataset(
-                topic_name, topic_2_start_date, topic_2_end_date, topic_tags
-            )
-            jobs_mean = jobs.apply(numpy.mean, axis=1)
-            jobs_std = jobs.apply(numpy.std, axis=1)
-            coeff_var = jobs_std / jobs_mean
-            coeff_var.sort_values(ascending=False, inplace=True)
-
-            testcases = coeff_var.index.tolist()
-            data = []
-            for testcase in testcases:
-                if not threshold:
-                    data.append({"testcase": testcase, "value": coeff_var[testcase]})
-                if threshold and coeff_var[testcase] <= threshold:
-                    data.append({"testcase": testcase, "value": coeff_var[testcase]})
-
-            coefficient_variations_table = dash_table.DataTable(
-                id="table",
-                columns=[
-                    {"name": "testcase", "id": "testcase"},
-                    {"name": "value", "id": "value"},
-                ],
-                data=data,
-                page_current=0,
-                page_size=15,
-            )
-
-            return coefficient_variations_table
-
-        coefficient_variations_table_1 = get_coefficient_variation_table(
-            topic_1, topic_1_start_date, topic_1_end_date, topic_1_tags
-        )
-
-        # use topic 1 filtered tests for topic 2 filtration as well
-        filtered_tests = _filter_tests_by_cov(
-            coefficient_variations_table_1.data, cov_filtration
-        )
-
-        # compute coefficient of variation table with threshold
-        coefficient_variations_table_1 = get_coefficient_variation_table(
-            topic_1, topic_1_start_date, topic_1_end_date, topic_1_tags, cov_filtration
-        )
-
-        coefficient_variations_table_2 = get_coefficient_variation_table(
-            topic_2, topic_2_start_date, topic_2_end_date, topic_2_tags, cov_filtration
-        )
-
-        if topic_1_computation == "median":
-            compared_jobs, jobs_ids_dates = analyzer.comparison_with_median(
-                topic_1,
-                topic_2,
-                topic_1_start_date,
-                topic_1_end_date,
-                topic_2_start_date,
-                topic_2_end_date,
-                topic_1_tags,
-                topic_2_tags,
-                topic_2_computation,
-                filtered_tests,
-            )
-        else:
-            compared_jobs, jobs_ids_dates = analyzer.comparison_with_mean(
-                topic_1,
-                topic_2,
-                topic_1_start_date,
-                topic_1_end_date,
-                topic_2_start_date,
-                topic_2_end_date,
-                topic_1_tags,
-                topic_2_tags,
-                topic_2_computation,
-                filtered_tests,
-            )
+        # the parameters of the comparison are kept by the browser, the
+        # tables request their pages with them
+        params = {
+            "topic_1": topic_1,
+            "topic_2": topic_2,
+            "topic_1_start_date": topic_1_start_date,
+            "topic_1_end_date": topic_1_end_date,
+            "topic_2_start_date": topic_2_start_date,
+            "topic_2_end_date": topic_2_end_date,
+            "topic_1_tags": topic_1_tags,
+            "topic_2_tags": topic_2_tags,
+            "topic_1_computation": topic_1_computation,
+            "topic_2_computation": topic_2_computation,
+            "cov_filtration": cov_filtration,
+            "evolution_percentage_value": evolution_percentage_value,
+        }
+        result = get_comparison(params)
+        if result is None:
+            no_jobs = "No jobs found for the selected topics, dates and tags !"
+            return (no_jobs,) * 8 + (None,)
+
+        # Coefficient of Variation data tables
+        coefficient_variations_table_1 = server_side_table("coeff_var_1_table")
+        coefficient_variations_table_2 = server_side_table("coeff_var_2_table")
 
         # Bar chart, histogram
-        min = compared_jobs.min() - 1.0
-        if isinstance(min, float):
-            min = int(min)
-        else:
-            min = int(min.min())
-
-        max = compared_jobs.max() + 1.0
-        if isinstance(max, float):
-            max = int(max)
-        else:
-            max = int(max.max())
-
-        interval = int((max - min) / 25.0)
-        if interval == 0:
-            interval = 1
-        intervals = []
-        for i in range(min, max, interval):
-            intervals.append((i, i + interval))
-        intervals.sort()
-        result = {}
-        for i in intervals:
-            result[i] = 0
-        for i in range(0, compared_jobs.shape[0]):
-            for j in range(0, compared_jobs.shape[1]):
-                value = compared_jobs.iloc[i, j]
-                for inter in intervals:
-                    if value >= inter[0] and value < inter[1]:
-                        result[inter] += 1
-        values = []
-        for inter in intervals:
-            values.append(result[inter])
+        histogram = result.histogram
 
         comparisons = dcc.Graph(
             figure={
                 "data": [
                     {
                         "type": "bar",
-                        "x": ["(%s,%s)" % (i, j) for i, j in intervals],
-                        "y": values,
+                        "x": ["(%s,%s)" % (i, j) for i, j in histogram.intervals],
+                        "y": histogram.counts,
                     },
                 ],
                 "layout": {
@@ -468,121 +399,45 @@ def update_output(
 
         # Comparisons details data table
         # show the delta of each test case in percentage
-        # compared_jobs contains only one column
-        job_id = compared_jobs.columns.tolist()[0]
-        compared_jobs.sort_values(by=job_id, ascending=False, inplace=True)
-        testcases = compared_jobs.index.tolist()
-        data = []
-        for testcase in testcases:
-            data.append(
-                {"testcase": testcase, "value": compared_jobs.loc[testcase, job_id]}
-            )
-        comparisons_details = dash_table.DataTable(
-            id="table",
-            columns=[
-                {"name": "testcase", "id": "testcase"},
-                {"name": "value", "id": "value"},
-            ],
-            data=data,
-            page_current=0,
-            page_size=15,
-        )
-
-        if topic_1_computation == "median":
-            compared_jobs, jobs_ids_dates = analyzer.comparison_with_median(
-                topic_1,
-                topic_2,
-                topic_1_start_date,
-                topic_1_end_date,
-                topic_2_start_date,
-                topic_2_end_date,
-                topic_1_tags,
-                topic_2_tags,
-                filtered_tests=filtered_tests,
-            )
-        else:
-            compared_jobs, jobs_ids_dates = analyzer.comparison_with_mean(
-                topic_1,
-                topic_2,
-                topic_1_start_date,
-                topic_1_end_date,
-                topic_2_start_date,
-                topic_2_end_date,
-                topic_1_tags,
-                topic_2_tags,
-                filtered_tests=filtered_tests,
-            )
-
-        # graph per class
-        def graph_per_class(topic, topic_start_date, topic_end_date, topic_tags):
-            def getClass(testname):
-                return testname.split("/")[0]
-
-            jobs, jobs_ids_dates = analyzer.get_jobs_dataset(
-                topic,
-                topic_start_date,
-                topic_end_date,
-                topic_tags,
-                filtered_tests=filtered_tests,
-            )
-            testnames = jobs.index.tolist()
-            classes = list(map(getClass, testnames))
-            jobs["class"] = classes
-            jobs_sum_per_class = jobs.groupby("class").sum()
-            jobs_columns = list(jobs_sum_per_class.columns)
-            jobs_index = list(jobs_sum_per_class.index)
-
-            nb_rows = len(jobs_index)
-
-            fig = make_subplots(rows=nb_rows, cols=1, subplot_titles=jobs_index)
-
-            for row, j_i in enumerate(jobs_index, 1):
-                j_c = list(range(len(jobs_columns)))
-                fig.append_trace(
-                    go.Scatter(
-                        x=j_c,
-                        text=jobs_columns,
-                        y=list(jobs_sum_per_class.loc[j_i]),
-                        name="lol",
+        comparisons_details = server_side_table("comparison_details_table")
+
+        # graph per class, only the selected classes are plotted
+        def graph_per_class_selector(graph_id, jobs_sum_per_class):
+            classes = list(jobs_sum_per_class.index)
+            return html.Div(
+                [
+                    dcc.Dropdown(
+                        id="%s_classes" % graph_id,
+                        options=[{"label": c, "value": c} for c in classes],
+                        value=classes[:DEFAULT_CLASSES],
+                        multi=True,
                     ),
-                    row=row,
-                    col=1,
-                )
-
-            fig.update_layout(height=1200, showlegend=False)
-            return dcc.Graph(figure=fig)
+                    html.Div(id="%s_graph" % graph_id),
+                ]
+            )
 
-        graph_per_class_topic_1 = graph_per_class(
-            topic_1, topic_1_start_date, topic_1_end_date, topic_1_tags
+        graph_per_class_topic_1 = graph_per_class_selector(
+            "graph_per_class_1", result.sum_per_class_1
         )
-        graph_per_class_topic_2 = graph_per_class(
-            topic_2, topic_2_start_date, topic_2_end_date, topic_2_tags
+        graph_per_class_topic_2 = graph_per_class_selector(
+            "graph_per_class_2", result.sum_per_class_2
         )
 
         # Trends graph
-        evolution_percentage_value
-        float_evolution_percentage_value = float(evolution_percentage_value) / 100.0
-        trend_values = []
-        for j in range(0, compared_jobs.shape[1]):
-            job_column = []
-            for i in range(0, compared_jobs.shape[0]):
-                value = compared_jobs.iloc[i, j]
-                job_column.append(value)
-            job_column.sort()
-            index_percentage = int(len(job_column) * float_evolution_percentage_value)
-            if index_percentage >= len(job_column):
-                index_percentage = len(job_column) - 1
-            trend_values.append(job_column[index_percentage])
-
+        # the percentiles are plotted on the same downsampled jobs
+        trends_jobs = list(result.trends.columns)
+        trends_positions = downsampling.downsample_rows(result.trends)
         trends = dcc.Graph(
             figure={
                 "data": [
                     {
-                        "type": "line",
-                        "name": "trend",
-                        "x": list(compared_jobs.columns),
-                        "y": trend_values,
+                        "type": "scattergl",
+                        "mode": "lines",
+                        "name": "%gth" % evolution_percentage,
+                        "x": [trends_jobs[p] for p in trends_positions],
+                        "y": trend_values.iloc[trends_positions].tolist(),
                     }
+                    for evolution_percentage, trend_values in result.trends.iterrows()
                 ],
                 "layout": {
                     "title": "Evolution of the %sth tests, %s/%s vs %s/%s"
@@ -594,7 +449,10 @@ def update_output(
                         topic_2_computation,
                     ),
                     "xaxis": {"title": "%s/Jobs" % topic_1_computation},
-                    "yaxis": {"title": "Maximum evolution of 95% tests"},
+                    "yaxis": {
+                        "title": "Maximum evolution of %s%% tests"
+                        % evolution_percentage_value
+                    },
                 },
             }
         )
@@ -602,7 +460,7 @@ def update_output(
         # Trend Jobs details data table
         # show the delta of each test case in percentage
         data = []
-        for jid in jobs_ids_dates:
+        for jid in result.all_jobs_ids_dates:
             data.append(
                 {
                     "date": jid["date"],
@@ -611,7 +469,7 @@ def update_output(
                 }
             )
         trends_jobs_details = dash_table.DataTable(
-            id="table",
+            id="trend_jobs_table",
             columns=[
                 {"name": "date", "id": "date"},
                 {"name": "id", "id": "id", "presentation": "markdown"},
@@ -630,19 +488,279 @@ def update_output(
             graph_per_class_topic_2,
             trends,
             trends_jobs_details,
+            params,
+        )
+
+
+def get_comparison(params):
+    """Return the result of the comparison of the parameters kept by the
+    browser, from the results cache or computed again."""
+    topic_1_end_date = analyzer.string_to_date(params["topic_1_end_date"])
+    topic_2_end_date = analyzer.string_to_date(params["topic_2_end_date"])
+    topic_1_tags = params["topic_1_tags"]
+    topic_2_tags = params["topic_2_tags"]
+    return analyzer.get_comparison(
+        params["topic_1"],
+        params["topic_2"],
+        analyzer.string_to_date(params["topic_1_start_date"]),
+        topic_1_end_date - timedelta(days=1),
+        analyzer.string_to_date(params["topic_2_start_date"]),
+        topic_2_end_date - timedelta(days=1),
+        topic_1_tags.split(",") if topic_1_tags else topic_1_tags,
+        topic_2_tags.split(",") if topic_2_tags else topic_2_tags,
+        params["topic_1_computation"],
+        params["topic_2_computation"],
+        float(params["cov_filtration"]),
+        [
+            float(p)
+            for p in params["evolution_percentage_value"].split(",")
+            if p.strip()
+        ],
+    )
+
+
+def server_side_table(table_id):
+    """DataTable of the testcases values whose rows are paged, sorted and
+    filtered by the server."""
+    return dash_table.DataTable(
+        id=table_id,
+        columns=[
+            {"name": "testcase", "id": "testcase"},
+            {"name": "value", "id": "value", "type": "numeric"},
+        ],
+        page_current=0,
+        page_size=15,
+        page_action="custom",
+        sort_action="custom",
+        sort_mode="multi",
+        sort_by=[],
+        filter_action="custom",
+        filter_query="",
+    )
+
+
+def get_comparison_details(result):
+    # compared_jobs contains only one column, sorted by decreasing delta
+    compared_jobs = result.compared_jobs.iloc[:, 0]
+    return tables.series_to_frame(compared_jobs.sort_values(ascending=False))
+
+
+def get_coefficient_variations(params, topic, cov_filtration):
+    """Return the coefficients of variation of the topic 1 or 2 of the
+    comparison parameters below the current CoV threshold, without the
+    comparison."""
+    tags = params["topic_%s_tags" % topic]
+    end_date = analyzer.string_to_date(params["topic_%s_end_date" % topic])
+    return analyzer.get_coefficient_variations(
+        params["topic_%s" % topic],
+        analyzer.string_to_date(params["topic_%s_start_date" % topic]),
+        end_date - timedelta(days=1),
+        tags.split(",") if tags else tags,
+        float(cov_filtration),
+    )
+
+
+def register_page_callback(table_id, get_frame):
+    """Register the callback returning the current page of the table, the
+    rows come from the DataFrame given by get_frame for the result of the
+    comparison."""
+
+    @dashboard.callback(
+        [
+            dash.dependencies.Output(table_id, "data"),
+            dash.dependencies.Output(table_id, "page_count"),
+        ],
+        [
+            dash.dependencies.Input(table_id, "page_current"),
+            dash.dependencies.Input(table_id, "page_size"),
+            dash.dependencies.Input(table_id, "sort_by"),
+            dash.dependencies.Input(table_id, "filter_query"),
+        ],
+        [dash.dependencies.State("comparison_params", "data")],
+    )
+    def update_page(page_current, page_size, sort_by, filter_query, params):
+        result = get_comparison(params) if params else None
+        if result is None:
+            return [], 1
+        return tables.get_page(
+            get_frame(result), page_current, page_size, sort_by, filter_query
+        )
+
+    return update_page
+
+
+def register_coefficient_variation_callback(table_id, topic):
+    """Register the callback returning the current page of the coefficients
+    of variation table of the topic 1 or 2, refreshed when the CoV
+    threshold changes."""
+
+    @dashboard.callback(
+        [
+            dash.dependencies.Output(table_id, "data"),
+            dash.dependencies.Output(table_id, "page_count"),
+        ],
+        [
+            dash.dependencies.Input(table_id, "page_current"),
+            dash.dependencies.Input(table_id, "page_size"),
+            dash.dependencies.Input(table_id, "sort_by"),
+            dash.dependencies.Input(table_id, "filter_query"),
+            dash.dependencies.Input("cov_filtration", "value"),
+        ],
+        [dash.dependencies.State("comparison_params", "data")],
+    )
+    def update_page(
+        page_current, page_size, sort_by, filter_query, cov_filtration, params
+    ):
+        coeff_var = (
+            get_coefficient_variations(params, topic, cov_filtration)
+            if params
+            else None
+        )
+        if coeff_var is None:
+            return [], 1
+        return tables.get_page(
+            tables.series_to_frame(coeff_var),
+            page_current,
+            page_size,
+            sort_by,
+            filter_query,
+        )
+
+    return update_page
+
+
+def graph_per_class(jobs_sum_per_class, classes):
+    """Graph of the sum of the timings of the selected classes per job, one
+    WebGL subplot per class with its series downsampled."""
+    classes = [c for c in classes if c in jobs_sum_per_class.index]
+    if not classes:
+        return "Select the classes to plot"
+    jobs_columns = list(jobs_sum_per_class.columns)
+    fig = make_subplots(rows=len(classes), cols=1, subplot_titles=classes)
+    for row, class_name in enumerate(classes, 1):
+        positions, values = downsampling.downsample(jobs_sum_per_class.loc[class_name])
+        fig.append_trace(
+            go.Scattergl(
+                x=positions.tolist(),
+                text=[jobs_columns[p] for p in positions],
+                y=values.tolist(),
+                name=class_name,
+            ),
+            row=row,
+            col=1,
+        )
+    fig.update_layout(height=CLASS_GRAPH_HEIGHT * len(classes), showlegend=False)
+    return dcc.Graph(figure=fig)
+
+
+def register_graph_per_class_callback(graph_id, get_sum_per_class):
+    """Register the callback plotting the classes selected in the graph per
+    class, from the sums per class of the result of the comparison."""
+
+    @dashboard.callback(
+        dash.dependencies.Output("%s_graph" % graph_id, "children"),
+        [dash.dependencies.Input("%s_classes" % graph_id, "value")],
+        [dash.dependencies.State("comparison_params", "data")],
+    )
+    def update_graph(classes, params):
+        result = get_comparison(params) if params else None
+        if result is None:
+            return "Compute the comparison first"
+        return graph_per_class(get_sum_per_class(result), classes or [])
+
+    return update_graph
+
+
+register_page_callback("comparison_details_table", get_comparison_details)
+register_coefficient_variation_callback("coeff_var_1_table", 1)
+register_coefficient_variation_callback("coeff_var_2_table", 2)
+register_graph_per_class_callback(
+    "graph_per_class_1", lambda result: result.sum_per_class_1
+)
+register_graph_per_class_callback(
+    "graph_per_class_2", lambda result: result.sum_per_class_2
+)
+
+
+@dashboard.callback(
+    dash.dependencies.Output("details_testname", "options"),
+    [dash.dependencies.Input("details_topic", "value")],
+)
+def update_details_testnames(topic_name):
+    if not topic_name:
+        return []
+    return [{"label": t, "value": t} for t in analyzer.get_topic_tests(topic_name)]
+
+
+@dashboard.callback(
+    dash.dependencies.Output("details_test_history", "children"),
+    [
+        dash.dependencies.Input("details_topic", "value"),
+        dash.dependencies.Input("details_testname", "value"),
+    ],
+)
+def update_details_test_history(topic_name, testname):
+    if not topic_name or not testname:
+        return "Select a topic and a test"
+    # only the row of the test is read from the store
+    history = analyzer.get_test_history(topic_name, testname)
+    if history.empty:
+        return "No jobs found for the test %s !" % testname
+    fig = go.Figure(
+        go.Scatter(
+            x=list(history["created_at"]),
+            y=list(history["time"]),
+            customdata=list(history["id"]),
+            mode="lines+markers",
+            name=testname,
         )
+    )
+    fig.update_layout(
+        title="Evolution of %s, click a job for its details" % testname,
+        xaxis_title="date",
+        yaxis_title="time",
+    )
+    return dcc.Graph(id="details_test_graph", figure=fig)
+
+
+@dashboard.callback(
+    dash.dependencies.Output("details_job", "children"),
+    [dash.dependencies.Input("details_test_graph", "clickData")],
+    [dash.dependencies.State("details_topic", "value")],
+)
+def update_details_job(click_data, topic_name):
+    if not click_data or not topic_name:
+        return "Click a job of the test history"
+    job_id = click_data["points"][0]["customdata"]
+    # only the column of the job is read from the store
+    timings = analyzer.get_job_timings(topic_name, job_id)
+    if timings is None:
+        return "Job %s not found !" % job_id
+    timings = timings.sort_values(ascending=False)
+    return html.Div(
+        [
+            dcc.Markdown(
+                "[Job %s](https://www.distributed-ci.io/jobs/%s/jobStates), %s tests"
+                % (job_id, job_id, len(timings))
+            ),
+            dash_table.DataTable(
+                id="details_job_table",
+                columns=[
+                    {"name": "testcase", "id": "testcase"},
+                    {"name": "time", "id": "time"},
+                ],
+                data=[{"testcase": t, "time": v} for t, v in timings.items()],
+                page_current=0,
+                page_size=15,
+            ),
+        ]
+    )
 
 
 def get_min_max_date_from_topic(topic_name):
-    csv_files = glob.glob("%s/%s/*.csv" % (analyzer.WORKING_DIR, topic_name))
-    sorted_csv_files = analyzer.get_sorted_csv_files(csv_files, topic_name)
-    if len(sorted_csv_files) >= 2:
-        min_file = sorted_csv_files[0]
-        min_date = analyzer.string_to_date(min_file.split("/")[1].split("_")[0])
-        max_file = sorted_csv_files[-1]
-        max_date = analyzer.string_to_date(
-            max_file.split("/")[1].split("_")[0]
-        ) + timedelta(days=1)
+    min_date, max_date = analyzer.get_min_max_dates(topic_name)
+    if min_date is not None:
+        max_date = max_date + timedelta(days=1)
         return min_date, min_date, max_date, max_date
     else:
         return None, None, None, None
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import logging
+import sys
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+
+class LRUCache(object):
+    """Thread safe LRU cache bounded by the size in bytes of its values.
+
+    Each entry is stored with a signature, an entry whose signature does
+    not match the one given at lookup time is stale and dropped.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, signature=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != signature:
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, nbytes, signature=None):
+        if nbytes > self.max_bytes:
+            LOG.debug("%s bytes value too large for the cache" % nbytes)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (signature, value, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "size": self._size,
+                "max_size": self.max_bytes,
+            }
+
+    def _remove(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self._size -= nbytes
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Compact representation of the jobs datasets.
+#
+# In compact mode, enabled with DCI_ANALYSIS_COMPACT=1, the datasets have
+# float32 timings and are indexed by integer test ids instead of the test
+# names. The ids come from one dictionary shared by all the topics, which
+# also keeps the id of the class of each test, so the datasets of two
+# topics are aligned and grouped per class on integers. The names are only
+# decoded in the results given to the dashboard.
+
+import os
+import threading
+
+import numpy
+import pandas as pd
+
+
+ENABLED = os.getenv("DCI_ANALYSIS_COMPACT", "") not in ("", "0")
+
+# name of the index of the compact datasets
+TESTS_INDEX_NAME = "testid"
+
+
+class TestsDictionary(object):
+    """Thread safe dictionary of the test names to integer ids, the ids
+    are never reused so they can be shared by all the cached datasets."""
+
+    def __init__(self):
+        self.names = []
+        self.class_names = []
+        self._ids = {}
+        self._class_ids = {}
+        self._classes = numpy.empty(0, dtype=numpy.int32)
+        self._lock = threading.Lock()
+
+    def encode(self, names):
+        """Return the array of the ids of the names, the unknown names are
+        added to the dictionary."""
+        ids = numpy.empty(len(names), dtype=numpy.int32)
+        with self._lock:
+            new_classes = []
+            for i, name in enumerate(names):
+                test_id = self._ids.get(name)
+                if test_id is None:
+                    test_id = len(self.names)
+                    self._ids[name] = test_id
+                    self.names.append(name)
+                    class_name = name.split("/")[0]
+                    class_id = self._class_ids.get(class_name)
+                    if class_id is None:
+                        class_id = len(self.class_names)
+                        self._class_ids[class_name] = class_id
+                        self.class_names.append(class_name)
+                    new_classes.append(class_id)
+                ids[i] = test_id
+            if new_classes:
+                self._classes = numpy.concatenate(
+                    [self._classes, numpy.asarray(new_classes, dtype=numpy.int32)]
+                )
+        return ids
+
+    def decode(self, ids):
+        names = self.names
+        return [names[i] for i in ids]
+
+    def get_classes(self, ids):
+        """Return the array of the class ids of the tests ids."""
+        return self._classes[numpy.asarray(ids, dtype=numpy.int64)]
+
+
+TESTS = TestsDictionary()
+
+
+def is_compact(data):
+    return data.index.name == TESTS_INDEX_NAME
+
+
+def compact(jobs_dataset):
+    """Return the compact version of a dataset indexed by test names."""
+    index = pd.Index(TESTS.encode(list(jobs_dataset.index)), name=TESTS_INDEX_NAME)
+    return pd.DataFrame(
+        jobs_dataset.to_numpy(dtype=numpy.float32),
+        index=index,
+        columns=jobs_dataset.columns,
+    )
+
+
+def encode(tests):
+    """Return the ids of the tests, given by names or ids."""
+    return [
+        t if isinstance(t, (int, numpy.integer)) else TESTS.encode([t])[0]
+        for t in tests
+    ]
+
+
+def encode_index(data):
+    """Return the DataFrame or Series indexed by the test ids, it is
+    returned unchanged if it is already compact."""
+    if is_compact(data):
+        return data
+    data = data.copy(deep=False)
+    data.index = pd.Index(TESTS.encode(list(data.index)), name=TESTS_INDEX_NAME)
+    return data
+
+
+def decode(data):
+    """Return the DataFrame or Series indexed by the test names, it is
+    returned unchanged if it is not compact."""
+    if not is_compact(data):
+        return data
+    data = data.copy(deep=False)
+    data.index = pd.Index(TESTS.decode(data.index), name="testname")
+    return data
+
+
+def decode_tests(tests):
+    """Return the set of the names of the tests, given by names or ids."""
+    return set(
+        TESTS.names[t] if isinstance(t, (int, numpy.integer)) else t for t in tests
+    )
+
+
+def sum_per_class(jobs):
+    """Sum the timings of the compact dataset per test class."""
+    sums = jobs.groupby(TESTS.get_classes(jobs.index)).sum()
+    sums.index = pd.Index([TESTS.class_names[c] for c in sums.index], name="class")
+    return sums
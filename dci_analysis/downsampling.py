@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Downsampling of the series plotted by the dashboard.
+#
+# A series longer than MAX_POINTS is reduced with the Largest Triangle Three
+# Buckets algorithm: the first and last points are kept and the others are
+# split in buckets, the point kept in a bucket is the one forming the
+# largest triangle with the point kept in the previous bucket and the
+# average of the next bucket. The peaks and the shape of the series are
+# preserved while the size of the figures does not grow with the number of
+# jobs.
+
+import os
+
+import numpy
+
+
+# maximum number of points of a plotted series
+MAX_POINTS = int(os.getenv("DCI_ANALYSIS_GRAPH_POINTS", 1000))
+
+
+def lttb(x, y, threshold=MAX_POINTS):
+    """Return the sorted indices of the points of the (x, y) series kept by
+    the LTTB algorithm, all of them if the series is not longer than the
+    threshold."""
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    nb_points = len(x)
+    if threshold >= nb_points or threshold < 3:
+        return numpy.arange(nb_points)
+
+    indices = numpy.empty(threshold, dtype=numpy.int64)
+    indices[0] = 0
+    indices[-1] = nb_points - 1
+    # the points between the first and the last ones are split in
+    # threshold - 2 buckets, the bucket i is [edges[i], edges[i + 1])
+    edges = numpy.linspace(1, nb_points - 1, threshold - 1).astype(numpy.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end : edges[i + 2]].mean()
+            next_y = y[end : edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = numpy.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(numpy.argmax(numpy.nan_to_num(areas, nan=-1.0)))
+        indices[i + 1] = a
+    return indices
+
+
+def downsample(y, threshold=MAX_POINTS):
+    """Return the positions and the values of the points of the series kept
+    by LTTB, the series is plotted against the positions of its values and
+    its NaN are dropped."""
+    y = numpy.asarray(y, dtype=float)
+    positions = numpy.flatnonzero(~numpy.isnan(y))
+    kept = positions[lttb(positions, y[positions], threshold)]
+    return kept, y[kept]
+
+
+def downsample_rows(frame, threshold=MAX_POINTS):
+    """Return the sorted positions of the columns of the DataFrame kept by
+    LTTB for any of its rows, so all its rows are plotted on the same
+    points."""
+    positions = [numpy.empty(0, dtype=numpy.int64)]
+    for _, values in frame.iterrows():
+        positions.append(downsample(values, threshold)[0])
+    return numpy.unique(numpy.concatenate(positions))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Local cache of the raw junit files downloaded by the sync.
+#
+# The files of the DCI api never change once uploaded, so a junit file is
+# keyed by its file id: WORKING_DIR/.junit_cache/<2 first chars>/<id>.xml.gz
+# holds the gzip compressed payload and <id>.json next to it the metadata
+# needed to convert it again without the api: the job, topic and test name
+# plus the sha256 and size of the payload.
+#
+# The cache is bounded by DCI_ANALYSIS_JUNIT_CACHE_SIZE megabytes, the
+# oldest entries are evicted first.
+
+import datetime
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+JUNIT_CACHE_DIR = ".junit_cache"
+MAX_SIZE = int(os.getenv("DCI_ANALYSIS_JUNIT_CACHE_SIZE", 10240)) * 1024 * 1024
+
+
+def get_cache_path(working_dir):
+    return "%s/%s" % (working_dir, JUNIT_CACHE_DIR)
+
+
+def get_entry_path(working_dir, file_id):
+    """Return the path of the entry without extension."""
+    return "%s/%s/%s" % (get_cache_path(working_dir), file_id[:2], file_id)
+
+
+def contains(working_dir, file_id):
+    entry_path = get_entry_path(working_dir, file_id)
+    return os.path.exists("%s.json" % entry_path) and os.path.exists(
+        "%s.xml.gz" % entry_path
+    )
+
+
+def open_entry(working_dir, file_id):
+    """Return the decompressed junit file object of the entry."""
+    return gzip.open("%s.xml.gz" % get_entry_path(working_dir, file_id), "rb")
+
+
+def read_metadata(metadata_path):
+    try:
+        with open(metadata_path, "r") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def iter_entries(working_dir):
+    """Yield the metadata of the complete entries of the cache."""
+    pattern = "%s/*/*.json" % get_cache_path(working_dir)
+    for metadata_path in sorted(glob.glob(pattern)):
+        if not os.path.exists(metadata_path[: -len(".json")] + ".xml.gz"):
+            continue
+        metadata = read_metadata(metadata_path)
+        if metadata is not None:
+            yield metadata
+
+
+class CacheWriter(object):
+    """File object reading the junit file while writing it to the cache.
+
+    The payload is compressed on the fly, the entry only becomes visible
+    once commit() is called after the whole payload has been read.
+    """
+
+    def __init__(self, working_dir, file_id, junit_file, metadata):
+        self.entry_path = get_entry_path(working_dir, file_id)
+        self.junit_file = junit_file
+        self.metadata = dict(metadata, file_id=file_id)
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+        os.makedirs(os.path.dirname(self.entry_path), exist_ok=True)
+        # two threads may cache the same file, each writes its own tmp file
+        self._tmp_suffix = "%s.%s.tmp" % (os.getpid(), threading.get_ident())
+        self._tmp_path = "%s.xml.gz.%s" % (self.entry_path, self._tmp_suffix)
+        self._out = gzip.open(self._tmp_path, "wb", compresslevel=6)
+
+    def read(self, size=-1):
+        data = self.junit_file.read(size)
+        if data:
+            self._sha256.update(data)
+            self._size += len(data)
+            self._out.write(data)
+        return data
+
+    def commit(self):
+        # the parser may stop before the end of the payload
+        while self.read(64 * 1024):
+            pass
+        self._out.close()
+        self.metadata["sha256"] = self._sha256.hexdigest()
+        self.metadata["size"] = self._size
+        self.metadata["cached_at"] = datetime.datetime.utcnow().isoformat()
+        os.replace(self._tmp_path, "%s.xml.gz" % self.entry_path)
+        tmp_metadata_path = "%s.json.%s" % (self.entry_path, self._tmp_suffix)
+        with open(tmp_metadata_path, "w") as f:
+            f.write(json.dumps(self.metadata))
+        os.replace(tmp_metadata_path, "%s.json" % self.entry_path)
+
+    def abort(self):
+        self._out.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def evict(working_dir, max_size=None):
+    """Remove the oldest entries until the cache fits in max_size bytes,
+    return the number of removed entries."""
+    max_size = MAX_SIZE if max_size is None else max_size
+    entries = []
+    size = 0
+    for payload_path in glob.glob("%s/*/*.xml.gz" % get_cache_path(working_dir)):
+        try:
+            stat = os.stat(payload_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, payload_path, stat.st_size))
+        size += stat.st_size
+    if size <= max_size:
+        return 0
+
+    nb_evicted = 0
+    for _, payload_path, payload_size in sorted(entries):
+        if size <= max_size:
+            break
+        entry_path = payload_path[: -len(".xml.gz")]
+        for path in ("%s.json" % entry_path, payload_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        size -= payload_size
+        nb_evicted += 1
+    LOG.info("evicted %s junit files from the cache" % nb_evicted)
+    return nb_evicted
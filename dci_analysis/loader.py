@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import concurrent.futures
+import logging
+import os
+import sys
+
+import pandas as pd
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+MAX_WORKERS = int(os.getenv("DCI_ANALYSIS_LOADER_WORKERS", 0)) or None
+
+
+def read_csv_file(csv_file):
+    return pd.read_csv(csv_file, delimiter=",", engine="c", index_col="testname")
+
+
+def read_csv_files(csv_files, join="inner", max_workers=MAX_WORKERS):
+    """Read the csv files concurrently and align them in one step.
+
+    Return the dataset, the list of the files actually loaded in the
+    same order as csv_files and the list of (file, error) of the files
+    which could not be read.
+    """
+    datasets = []
+    loaded_files = []
+    failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(read_csv_file, cf) for cf in csv_files]
+        for cf, future in zip(csv_files, futures):
+            try:
+                datasets.append(future.result())
+                loaded_files.append(cf)
+            except Exception as e:
+                LOG.error("unable to read %s: %s" % (cf, str(e)))
+                failures.append((cf, e))
+
+    if not datasets:
+        return None, loaded_files, failures
+    jobs_dataset = pd.concat(datasets, axis=1, join=join)
+    return jobs_dataset, loaded_files, failures
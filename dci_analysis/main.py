@@ -24,6 +24,8 @@ import traceback
 
 from dci_analysis import analyzer
 from dci_analysis import app
+from dci_analysis import serve
+from dci_analysis import sqlite_store
 from dci_analysis import sync_jobs
 
 
@@ -44,18 +46,30 @@ _EXCLUDE_TOPICS = {
 }
 
 
-def sync_topic(dci_context, team_name, topic_name, testname, working_dir):
-    LOG.info("create %s/%s/ directory" % (working_dir, topic_name))
-    os.makedirs("%s/%s" % (working_dir, topic_name), exist_ok=True)
-
+def sync_topics(
+    dci_context, team_name, topics_names, testname, working_dir, workers, full
+):
     try:
-        sync_jobs.sync(dci_context, team_name, topic_name, testname, working_dir)
+        sync_jobs.sync_topics(
+            dci_context, team_name, topics_names, testname, working_dir, workers, full
+        )
         LOG.info("done")
     except Exception:
         LOG.error(traceback.format_exc())
 
 
-def sync(team, product, topic, testname, working_dir):
+def sync(
+    team,
+    product,
+    topic,
+    testname,
+    working_dir,
+    workers,
+    full,
+    timeout=None,
+    retries=None,
+    rate_limit=None,
+):
     if (
         "DCI_CS_URL" not in os.environ
         or "DCI_CLIENT_ID" not in os.environ
@@ -77,15 +91,18 @@ def sync(team, product, topic, testname, working_dir):
         dci_client_id=os.environ["DCI_CLIENT_ID"],
         dci_api_secret=os.environ["DCI_API_SECRET"],
     )
+    sync_jobs.configure_session(dci_context, workers)
+    sync_jobs.configure_retry(timeout, retries, rate_limit)
 
     if product is not None:
         product_id = sync_jobs.get_product_id(dci_context, product)
         topics = sync_jobs.get_topics_of_product(dci_context, product_id)
-        for topic in topics:
-            if topic["name"] not in _EXCLUDE_TOPICS:
-                sync_topic(dci_context, team, topic["name"], testname, working_dir)
+        topics_names = [t["name"] for t in topics if t["name"] not in _EXCLUDE_TOPICS]
+        sync_topics(
+            dci_context, team, topics_names, testname, working_dir, workers, full
+        )
     elif topic is not None:
-        sync_topic(dci_context, team, topic, testname, working_dir)
+        sync_topics(dci_context, team, [topic], testname, working_dir, workers, full)
     else:
         LOG.error("missing --product or --topic option")
         sys.exit(1)
@@ -109,14 +126,132 @@ def main():
     p.add_argument(
         "--topic", type=str, help="The name of the topic to pull jobs from"
     )  # noqa
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=sync_jobs.DEFAULT_WORKERS,
+        help="The number of jobs downloaded concurrently",
+    )
+    p.add_argument(
+        "--full",
+        action="store_true",
+        help="Rescan all the jobs instead of the ones since the last sync",
+    )
+    p.add_argument(
+        "--timeout",
+        type=float,
+        default=sync_jobs.RETRY_POLICY.timeout,
+        help="The timeout in seconds of the api requests",
+    )
+    p.add_argument(
+        "--retries",
+        type=int,
+        default=sync_jobs.RETRY_POLICY.nb_retry,
+        help="The number of attempts of the api requests",
+    )
+    p.add_argument(
+        "--sqlite",
+        action="store_true",
+        help="Also write the timings to the sqlite store WORKING_DIR/timings.db",
+    )
+    p.add_argument(
+        "--rate-limit",
+        type=float,
+        help="The maximum number of api requests per second, unlimited by default",
+    )
+    p.add_argument(
+        "--reload-dashboard",
+        action="store_true",
+        help="Gracefully reload the dashboard served on the same host once done",
+    )
     p.set_defaults(command="sync")
 
+    p = subparsers.add_parser(
+        "reconvert", help="rebuild the csv files from the junit cache"
+    )
+    p.add_argument(
+        "--topic",
+        type=str,
+        action="append",
+        help="The name of a topic to rebuild, all the cached topics by default",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes converting the files, the cpus by default",
+    )
+    p.add_argument(
+        "--reload-dashboard",
+        action="store_true",
+        help="Gracefully reload the dashboard served on the same host once done",
+    )
+    p.set_defaults(command="reconvert")
+
     p = subparsers.add_parser("dashboard", help="run the dashboard server")
     p.set_defaults(command="dashboard")
 
+    p = subparsers.add_parser(
+        "serve", help="run the dashboard with several workers, requires gunicorn"
+    )
+    p.add_argument(
+        "--host",
+        type=str,
+        default=os.getenv("DCI_ANALYSIS_HOST", "0.0.0.0"),
+        help="The address to listen on",
+    )
+    p.add_argument(
+        "--port",
+        type=int,
+        default=int(os.getenv("DCI_ANALYSIS_PORT", 1234)),
+        help="The port to listen on",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=serve.DEFAULT_WORKERS,
+        help="The number of worker processes",
+    )
+    p.add_argument(
+        "--threads",
+        type=int,
+        default=serve.DEFAULT_THREADS,
+        help="The number of threads handling the requests of each worker",
+    )
+    p.add_argument(
+        "--preload",
+        action="store_true",
+        help="Load the application before forking the workers",
+    )
+    p.add_argument(
+        "--timeout",
+        type=int,
+        default=serve.DEFAULT_TIMEOUT,
+        help="The seconds after which a worker handling a request is restarted",
+    )
+    p.set_defaults(command="serve")
+
     args = parser.parse_args(sys.argv[1:])
     if args.command == "sync":
-        sync(args.team, args.product, args.topic, args.testname, args.working_dir)
+        if args.sqlite:
+            sqlite_store.ENABLED = True
+        sync(
+            args.team,
+            args.product,
+            args.topic,
+            args.testname,
+            args.working_dir,
+            args.workers,
+            args.full,
+            args.timeout,
+            args.retries,
+            args.rate_limit,
+        )
+        if args.reload_dashboard:
+            serve.reload(args.working_dir)
+    elif args.command == "reconvert":
+        sync_jobs.reconvert(args.working_dir, args.topic, args.workers)
+        if args.reload_dashboard:
+            serve.reload(args.working_dir)
     elif args.command == "dashboard":
         analyzer.WORKING_DIR = args.working_dir
         app.dashboard.run_server(
@@ -124,6 +259,16 @@ def main():
             port=os.getenv("DCI_ANALYSIS_PORT", 1234),
             debug=True,
         )
+    elif args.command == "serve":
+        serve.serve(
+            args.working_dir,
+            args.host,
+            args.port,
+            args.workers,
+            args.threads,
+            args.preload,
+            args.timeout,
+        )
     sys.exit(0)
 
 
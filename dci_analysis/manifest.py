@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Manifest of the csv files of a topic.
+#
+# The manifest lists the jobs of the topic sorted by date with their id,
+# created_at, tags, number of tests, csv file name and size. It is written
+# in the store directory with the modification time of the topic directory
+# it describes, so a manifest is stale as soon as a file is added to or
+# removed from the topic directory.
+
+import bisect
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+
+from dci_analysis import store
+from dci_analysis import tags_log
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+MANIFEST_FILE = "manifest.json"
+
+# loaded manifests per topic path, with the mtimes of the topic directory
+# and of the manifest file they were loaded from
+_MANIFESTS = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+class Manifest(object):
+    def __init__(self, jobs):
+        self.jobs = sorted(jobs, key=lambda j: (j["date"], j["created_at"]))
+        self._dates = [j["date"] for j in self.jobs]
+
+    def between(self, start_date, end_date):
+        """Return the jobs created between the two dates included."""
+        start = bisect.bisect_left(self._dates, start_date.strftime("%Y-%m-%d"))
+        end = bisect.bisect_right(self._dates, end_date.strftime("%Y-%m-%d"))
+        return self.jobs[start:end]
+
+    def min_max_dates(self):
+        if not self.jobs:
+            return None, None
+        return self.jobs[0]["date"], self.jobs[-1]["date"]
+
+
+def get_manifest_path(working_dir, topic_name):
+    return "%s/%s" % (store.get_store_path(working_dir, topic_name), MANIFEST_FILE)
+
+
+def _get_topic_mtime(working_dir, topic_name):
+    return os.stat("%s/%s" % (working_dir, topic_name)).st_mtime_ns
+
+
+def _count_tests(csv_file):
+    with open(csv_file, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def make_entry(working_dir, topic_name, file_name, tags, created_at=None):
+    csv_file = "%s/%s/%s" % (working_dir, topic_name, file_name)
+    date, job_id = file_name.split("_")[:2]
+    return {
+        "id": job_id,
+        "created_at": created_at or date,
+        "date": date,
+        "tags": tags,
+        "tests": _count_tests(csv_file),
+        "file": file_name,
+        "size": os.path.getsize(csv_file),
+    }
+
+
+def _read(working_dir, topic_name):
+    try:
+        with open(get_manifest_path(working_dir, topic_name), "r") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _write(working_dir, topic_name, topic_mtime, jobs):
+    manifest_path = get_manifest_path(working_dir, topic_name)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = "%s.tmp" % manifest_path
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps({"topic_mtime": topic_mtime, "jobs": jobs}))
+    os.replace(tmp_path, manifest_path)
+
+
+def build(working_dir, topic_name, jobs_tags=None, jobs=None):
+    """Rebuild the manifest from the csv files of the topic directory.
+
+    The entries of the existing manifest and the given jobs entries are
+    reused, only the unknown csv files are read.
+    """
+    os.makedirs(store.get_store_path(working_dir, topic_name), exist_ok=True)
+    topic_mtime = _get_topic_mtime(working_dir, topic_name)
+    if jobs_tags is None:
+        jobs_tags = tags_log.read(working_dir, topic_name)
+
+    known_entries = {}
+    manifest = _read(working_dir, topic_name)
+    if manifest is not None:
+        known_entries.update((j["file"], j) for j in manifest["jobs"])
+    known_entries.update((j["file"], j) for j in jobs or [])
+
+    entries = []
+    for cf in glob.glob("%s/%s/*.csv" % (working_dir, topic_name)):
+        file_name = os.path.basename(cf)
+        tags = jobs_tags.get(file_name, [])
+        if file_name in known_entries:
+            entry = known_entries[file_name]
+            entry["tags"] = tags
+        else:
+            entry = make_entry(working_dir, topic_name, file_name, tags)
+        entries.append(entry)
+
+    LOG.info("write %s manifest with %s jobs" % (topic_name, len(entries)))
+    try:
+        _write(working_dir, topic_name, topic_mtime, entries)
+    except OSError as e:
+        LOG.error("unable to write %s manifest: %s" % (topic_name, str(e)))
+    return Manifest(entries)
+
+
+def load(working_dir, topic_name):
+    """Return the manifest of the topic, it is rebuilt if it is missing or
+    stale."""
+    topic_path = "%s/%s" % (working_dir, topic_name)
+    if not os.path.isdir(topic_path):
+        return Manifest([])
+    topic_mtime = _get_topic_mtime(working_dir, topic_name)
+    manifest_path = get_manifest_path(working_dir, topic_name)
+    try:
+        manifest_mtime = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        manifest_mtime = None
+    with _MANIFESTS_LOCK:
+        loaded = _MANIFESTS.get(topic_path)
+        if loaded is not None and loaded[0] == (topic_mtime, manifest_mtime):
+            return loaded[1]
+
+        manifest = _read(working_dir, topic_name)
+        if manifest is not None and manifest["topic_mtime"] == topic_mtime:
+            manifest = Manifest(manifest["jobs"])
+        else:
+            LOG.info("%s manifest is missing or stale" % topic_name)
+            manifest = build(working_dir, topic_name)
+        _MANIFESTS[topic_path] = ((topic_mtime, manifest_mtime), manifest)
+        return manifest
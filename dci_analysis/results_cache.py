@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Cache of the comparison results shared by the dashboard workers.
+#
+# A result is pickled in WORKING_DIR/.results_cache/<digest>.pickle, the
+# digest is the sha256 of the parameters of the comparison and of the
+# signatures of its topics, so the results of a synced topic are not found
+# anymore and are evicted with the oldest entries.
+#
+# A result is computed under the lock of its digest, <digest>.lock, held
+# between the threads and the processes: the requests of the same result
+# served by several workers wait for the first one and read its entry.
+#
+# The cache is bounded by DCI_ANALYSIS_RESULTS_DISK_CACHE_SIZE megabytes.
+
+import fcntl
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+RESULTS_CACHE_DIR = ".results_cache"
+MAX_SIZE = int(os.getenv("DCI_ANALYSIS_RESULTS_DISK_CACHE_SIZE", 1024)) * 1024 * 1024
+
+
+def get_cache_path(working_dir):
+    return "%s/%s" % (working_dir, RESULTS_CACHE_DIR)
+
+
+def get_digest(key, signature):
+    return hashlib.sha256(repr((key, signature)).encode("utf-8")).hexdigest()
+
+
+def get_entry_path(working_dir, digest):
+    return "%s/%s.pickle" % (get_cache_path(working_dir), digest)
+
+
+class Lock(object):
+    """Lock of the computation of a result, between threads and processes."""
+
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, working_dir, digest):
+        self.lock_path = "%s/%s.lock" % (get_cache_path(working_dir), digest)
+        with self._locks_lock:
+            self.lock = self._locks.setdefault(self.lock_path, threading.Lock())
+
+    def __enter__(self):
+        self.lock.acquire()
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self.fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.lock.release()
+
+
+def load(working_dir, digest):
+    """Return the cached result of the digest or None."""
+    try:
+        with open(get_entry_path(working_dir, digest), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        LOG.warning("unable to load the cached result %s: %s" % (digest, str(e)))
+        return None
+
+
+def save(working_dir, digest, result):
+    entry_path = get_entry_path(working_dir, digest)
+    tmp_path = "%s.%s.%s.tmp" % (entry_path, os.getpid(), threading.get_ident())
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+    except OSError as e:
+        LOG.warning("unable to cache the result %s: %s" % (digest, str(e)))
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+    evict(working_dir)
+
+
+def evict(working_dir, max_size=None):
+    """Remove the oldest entries until the cache fits in max_size bytes,
+    return the number of removed entries."""
+    max_size = MAX_SIZE if max_size is None else max_size
+    entries = []
+    size = 0
+    for entry_path in glob.glob("%s/*.pickle" % get_cache_path(working_dir)):
+        try:
+            stat = os.stat(entry_path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, entry_path, stat.st_size))
+        size += stat.st_size
+    if size <= max_size:
+        return 0
+
+    nb_evicted = 0
+    for _, entry_path, entry_size in sorted(entries):
+        if size <= max_size:
+            break
+        # the lock is removed with its entry, a worker computing the same
+        # result again creates a new one
+        for path in (entry_path, "%s.lock" % entry_path[: -len(".pickle")]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        size -= entry_size
+        nb_evicted += 1
+    LOG.info("evicted %s comparison results from the cache" % nb_evicted)
+    return nb_evicted
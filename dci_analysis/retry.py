@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from email.utils import parsedate_to_datetime
+import datetime
+import random
+import threading
+import time
+
+
+# statuses of the responses worth retrying, the others are final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryPolicy(object):
+    """Exponential backoff with full jitter, bounded by max_delay."""
+
+    def __init__(self, nb_retry=5, timeout=30, base_delay=0.5, max_delay=60):
+        self.nb_retry = nb_retry
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt, retry_after=None):
+        """Return the seconds to wait before the attempt following the
+        given one, a Retry-After delay from the server has precedence."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header value in seconds or None, it is
+    either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(tz=date.tzinfo)
+    return max((date - now).total_seconds(), 0.0)
+
+
+class TokenBucket(object):
+    """Thread safe token bucket shared by all the workers.
+
+    rate is the number of requests per second, None means unlimited. The
+    bucket can also be paused, when the server asks to slow down every
+    worker waits instead of hammering it at once.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate or 1, 1)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, delay):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and not self.rate:
+                    return
+                if wait <= 0:
+                    elapsed = now - self._updated_at
+                    self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
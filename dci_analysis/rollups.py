@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Daily rollups of the tests timings of a topic.
+#
+# TOPIC/store/rollups/<YYYY-MM-DD>.npz holds, for each combination of tags
+# of the jobs of the day, the number of jobs and, for each test, the count,
+# sum and sum of squares of its timings plus a quantile sketch. The rows
+# of the tests are the ones of the store matrix.
+#
+# The sketch counts the timings per logarithmic bin, a bin covers the
+# timings within a relative accuracy of SKETCH_ACCURACY, like DDSketch.
+# Sketches merge by adding the counts of their bins, so the aggregate of
+# any date range and tags expression is composed from the daily buckets:
+# the count, the mean and the variance are exact and a quantile is within
+# SKETCH_ACCURACY of a timing of the range, whatever the number of jobs.
+#
+# rollups/index.json records the tests and, per day, the job files with
+# their tags combination, so a sync only rewrites the days of its jobs.
+
+import glob
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+
+import numpy
+import pandas as pd
+
+from dci_analysis import cache
+from dci_analysis import stability
+from dci_analysis import store
+from dci_analysis import tags_index
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+ROLLUPS_DIR = "rollups"
+
+SKETCH_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# bin of the zero timings
+_ZERO_BIN = numpy.iinfo(numpy.int32).min
+
+# loaded daily rollups, bounded in MB
+DAYS_CACHE = cache.LRUCache(
+    int(os.getenv("DCI_ANALYSIS_ROLLUPS_CACHE_SIZE", 64)) * 1024 * 1024
+)
+
+
+def get_rollups_path(working_dir, topic_name):
+    return "%s/%s" % (store.get_store_path(working_dir, topic_name), ROLLUPS_DIR)
+
+
+def _get_index_path(rollups_path):
+    return "%s/index.json" % rollups_path
+
+
+def get_sketch_bins(values):
+    """Return the sketch bins of the timings."""
+    bins = numpy.full(values.shape, _ZERO_BIN, dtype=numpy.int32)
+    positive = values > 0
+    bins[positive] = numpy.ceil(numpy.log(values[positive]) / _LOG_GAMMA)
+    return bins
+
+
+def get_sketch_values(bins):
+    """Return the timing represented by each bin."""
+    values = 2.0 * numpy.power(_GAMMA, bins.astype(float)) / (_GAMMA + 1)
+    values[bins == _ZERO_BIN] = 0.0
+    return values
+
+
+def _rollup_day(matrix, keys):
+    """Compute the rollup of the (tests x jobs) matrix of a day, keys is the
+    tags combination key of each job."""
+    day_keys = sorted(set(keys))
+    nb_tests = matrix.shape[0]
+    nb_jobs = numpy.zeros(len(day_keys), dtype=numpy.int64)
+    counts = numpy.zeros((len(day_keys), nb_tests))
+    sums = numpy.zeros((len(day_keys), nb_tests))
+    sumsqs = numpy.zeros((len(day_keys), nb_tests))
+    sketches = []
+    for k, key in enumerate(day_keys):
+        columns = [i for i, job_key in enumerate(keys) if job_key == key]
+        values = matrix[:, columns]
+        valid = ~numpy.isnan(values)
+        nb_jobs[k] = len(columns)
+        counts[k] = numpy.count_nonzero(valid, axis=1)
+        sums[k] = numpy.nansum(values, axis=1)
+        sumsqs[k] = numpy.nansum(values**2, axis=1)
+        rows, cols = numpy.nonzero(valid)
+        pairs = numpy.stack([rows, get_sketch_bins(values[rows, cols])], axis=1)
+        pairs, pairs_counts = numpy.unique(pairs, axis=0, return_counts=True)
+        combinations = numpy.full(len(pairs), k)
+        sketch = numpy.column_stack([combinations, pairs, pairs_counts])
+        sketches.append(sketch.astype(numpy.int64))
+    return {
+        "keys": numpy.array(day_keys, dtype=str),
+        "nb_jobs": nb_jobs,
+        "count": counts,
+        "sum": sums,
+        "sumsq": sumsqs,
+        # rows of (combination, test, bin, count)
+        "sketch": numpy.concatenate(sketches) if sketches else numpy.empty((0, 4)),
+    }
+
+
+def _write_day(rollups_path, date, rollup):
+    tmp_path = "%s/%s.tmp.npz" % (rollups_path, date)
+    numpy.savez(tmp_path, **rollup)
+    os.replace(tmp_path, "%s/%s.npz" % (rollups_path, date))
+
+
+def _read_index(rollups_path):
+    try:
+        with open(_get_index_path(rollups_path), "r") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def update(working_dir, topic_name):
+    """Rewrite the rollups of the days whose jobs changed since the last
+    update."""
+    tests, jobs, matrix = store._load(store.get_store_path(working_dir, topic_name))
+    if matrix is None:
+        return
+    rollups_path = get_rollups_path(working_dir, topic_name)
+    index = _read_index(rollups_path)
+    # rollups of another store are rebuilt
+    if index is None or tests[: len(index["tests"])] != index["tests"]:
+        shutil.rmtree(rollups_path, ignore_errors=True)
+        index = {"tests": [], "days": {}}
+    os.makedirs(rollups_path, exist_ok=True)
+
+    columns_of_day = {}
+    for i, job in enumerate(jobs):
+        columns_of_day.setdefault(job["date"], []).append(i)
+    days = {}
+    for date, columns in columns_of_day.items():
+        days[date] = sorted(
+            "%s:%s" % (jobs[i]["file"], stability.get_tags_key(jobs[i]["tags"]))
+            for i in columns
+        )
+
+    changed_days = [d for d in sorted(days) if index["days"].get(d) != days[d]]
+    if changed_days:
+        LOG.info("update %s rollups of %s days" % (topic_name, len(changed_days)))
+    for date in changed_days:
+        columns = columns_of_day[date]
+        keys = [stability.get_tags_key(jobs[i]["tags"]) for i in columns]
+        _write_day(
+            rollups_path, date, _rollup_day(numpy.array(matrix[:, columns]), keys)
+        )
+    for date in set(index["days"]) - set(days):
+        os.remove("%s/%s.npz" % (rollups_path, date))
+
+    # the index is written last, it marks the rollups as fresh
+    tmp_path = "%s.tmp" % _get_index_path(rollups_path)
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps({"tests": tests, "days": days}))
+    os.replace(tmp_path, _get_index_path(rollups_path))
+
+
+def is_fresh(working_dir, topic_name):
+    index_path = _get_index_path(get_rollups_path(working_dir, topic_name))
+    jobs_path = "%s/jobs.json" % store.get_store_path(working_dir, topic_name)
+    try:
+        return os.stat(index_path).st_mtime_ns >= os.stat(jobs_path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def _load_day(day_path):
+    signature = os.stat(day_path).st_mtime_ns
+    rollup = DAYS_CACHE.get(day_path, signature)
+    if rollup is None:
+        with numpy.load(day_path, allow_pickle=False) as data:
+            rollup = {k: data[k] for k in data.files}
+        nbytes = sum(v.nbytes for v in rollup.values())
+        DAYS_CACHE.put(day_path, rollup, nbytes, signature)
+    return rollup
+
+
+class Aggregate(object):
+    """Aggregate of the daily rollups of a date range and tags expression."""
+
+    def __init__(self, tests, nb_jobs, count, sum, sumsq, sketch):
+        self.tests = tests
+        self.nb_jobs = nb_jobs
+        self.count = count
+        self.sum = sum
+        self.sumsq = sumsq
+        # rows of (test, bin, count)
+        self.sketch = sketch
+
+    def _rows(self):
+        # the tests run by all the jobs, like the loaded datasets
+        return (self.count == self.nb_jobs) & (self.count > 0)
+
+    def _series(self, values, rows):
+        tests = [t for t, row in zip(self.tests, rows) if row]
+        return pd.Series(values[rows], index=pd.Index(tests, name="testname"))
+
+    def mean(self):
+        rows = self._rows()
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            return self._series(self.sum / self.count, rows)
+
+    def coefficient_variation(self):
+        rows = self._rows()
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.count
+            variance = numpy.maximum(self.sumsq / self.count - mean**2, 0.0)
+            return self._series(numpy.sqrt(variance) / mean, rows)
+
+    def quantile(self, q):
+        """Return the q quantile of each test from the merged sketches, the
+        rank is interpolated between the two nearest timings like
+        DataFrame.quantile."""
+        rows = self._rows()
+        result = numpy.full(len(self.tests), numpy.nan)
+        if len(self.sketch):
+            order = numpy.lexsort((self.sketch[:, 1], self.sketch[:, 0]))
+            tests, bins, counts = self.sketch[order].T
+            starts = numpy.r_[0, numpy.flatnonzero(numpy.diff(tests)) + 1]
+            group_tests = tests[starts]
+            cumsum = numpy.cumsum(counts)
+            offsets = numpy.repeat(
+                numpy.r_[0, cumsum[starts[1:] - 1]],
+                numpy.diff(numpy.r_[starts, len(tests)]),
+            )
+            cumsum = cumsum - offsets
+            rank = q * (self.count[group_tests] - 1)
+            values = get_sketch_values(bins)
+            low = self._value_at_rank(
+                tests, cumsum, values, numpy.floor(rank), group_tests
+            )
+            high = self._value_at_rank(
+                tests, cumsum, values, numpy.ceil(rank), group_tests
+            )
+            fraction = rank - numpy.floor(rank)
+            result[group_tests] = low + (high - low) * fraction
+        return self._series(result, rows)
+
+    def _value_at_rank(self, tests, cumsum, values, rank, group_tests):
+        # first bin of each test whose cumulated count exceeds the rank
+        target = numpy.zeros(len(self.tests))
+        target[group_tests] = rank
+        candidates = numpy.flatnonzero(cumsum > target[tests])
+        _, first = numpy.unique(tests[candidates], return_index=True)
+        return values[candidates[first]]
+
+
+def aggregate(working_dir, topic_name, start_date, end_date, tags=None):
+    """Compose the daily rollups of the topic between the dates included,
+    of the jobs matching the tags expression. Return None if the rollups
+    are missing or stale."""
+    if not is_fresh(working_dir, topic_name):
+        return None
+    rollups_path = get_rollups_path(working_dir, topic_name)
+    index = _read_index(rollups_path)
+    if index is None:
+        return None
+    tests = index["tests"]
+    start = start_date.strftime("%Y-%m-%d")
+    end = end_date.strftime("%Y-%m-%d")
+
+    nb_jobs = 0
+    count = numpy.zeros(len(tests))
+    sums = numpy.zeros(len(tests))
+    sumsqs = numpy.zeros(len(tests))
+    sketches = []
+    for day_path in sorted(glob.glob("%s/*.npz" % rollups_path)):
+        date = os.path.basename(day_path)[: -len(".npz")]
+        if date < start or date > end:
+            continue
+        rollup = _load_day(day_path)
+        keys = [str(k) for k in rollup["keys"]]
+        selected = list(range(len(keys)))
+        if tags:
+            jobs_tags = dict((k, [t for t in k.split(",") if t]) for k in keys)
+            matched = tags_index.TagsIndex.from_jobs_tags(jobs_tags, keys).match(tags)
+            selected = [i for i, k in enumerate(keys) if k in matched]
+        if not selected:
+            continue
+        nb_tests = rollup["count"].shape[1]
+        nb_jobs += int(rollup["nb_jobs"][selected].sum())
+        count[:nb_tests] += rollup["count"][selected].sum(axis=0)
+        sums[:nb_tests] += rollup["sum"][selected].sum(axis=0)
+        sumsqs[:nb_tests] += rollup["sumsq"][selected].sum(axis=0)
+        sketch = rollup["sketch"]
+        sketches.append(sketch[numpy.isin(sketch[:, 0], selected)][:, 1:])
+    if nb_jobs == 0:
+        return None
+    sketch = numpy.concatenate(sketches)
+    return Aggregate(tests, nb_jobs, count, sums, sumsqs, sketch)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Production serving of the dashboard.
+#
+# The dashboard runs under gunicorn, an optional dependency, with several
+# worker processes of several threads each and debug off, each worker
+# handles its requests independently with its own caches. The WSGI
+# application is dci_analysis.app.server.
+#
+# The pid of the gunicorn master is written to WORKING_DIR/dashboard.pid,
+# a sync of the working directory run with --reload-dashboard sends it
+# SIGHUP once done: gunicorn starts new workers and stops the old ones
+# once their requests are done, so the workers start with empty caches
+# without interrupting the users. The pid is only signaled if it is a
+# dashboard visible from the sync, a dashboard in another container or
+# pid namespace is not reloaded.
+
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+try:
+    from gunicorn.app import base as gunicorn_base
+except ImportError:
+    gunicorn_base = None
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+PIDFILE = "dashboard.pid"
+
+DEFAULT_WORKERS = min(multiprocessing.cpu_count(), 4)
+DEFAULT_THREADS = 4
+# a comparison of large topics takes longer than the 30s default of gunicorn
+DEFAULT_TIMEOUT = 300
+
+
+def get_pidfile_path(working_dir):
+    return "%s/%s" % (working_dir, PIDFILE)
+
+
+def serve(
+    working_dir,
+    host,
+    port,
+    workers=DEFAULT_WORKERS,
+    threads=DEFAULT_THREADS,
+    preload=False,
+    timeout=DEFAULT_TIMEOUT,
+):
+    """Serve the dashboard of the working directory with gunicorn until it
+    is stopped."""
+    if gunicorn_base is None:
+        LOG.error("the serve command requires gunicorn: pip install gunicorn")
+        sys.exit(1)
+    # the workers loading the application read the working directory from
+    # the environment
+    os.environ["DCI_ANALYSIS_WORKING_DIR"] = working_dir
+    options = {
+        "bind": "%s:%s" % (host, port),
+        "workers": workers,
+        "threads": threads,
+        "preload_app": preload,
+        "timeout": timeout,
+        "pidfile": get_pidfile_path(working_dir),
+    }
+
+    class DashboardApplication(gunicorn_base.BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from dci_analysis import analyzer
+            from dci_analysis import app
+
+            analyzer.WORKING_DIR = working_dir
+            return app.server
+
+    LOG.info(
+        "serve the dashboard on %s with %s workers of %s threads"
+        % (options["bind"], workers, threads)
+    )
+    DashboardApplication().run()
+
+
+def is_dashboard(pid):
+    """Return True if the pid is the serve command of a dashboard in the
+    pid namespace of this process."""
+    if pid == os.getpid():
+        return False
+    try:
+        with open("/proc/%s/cmdline" % pid, "rb") as f:
+            args = f.read().decode("utf-8", "replace").split("\0")
+    except OSError:
+        return False
+    # the master is titled by gunicorn when setproctitle is installed
+    return "serve" in args or any(a.startswith("gunicorn: master") for a in args)
+
+
+def reload(working_dir):
+    """Gracefully reload the dashboard served for the working directory,
+    return False if it is not running."""
+    pidfile_path = get_pidfile_path(working_dir)
+    try:
+        with open(pidfile_path, "r") as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        LOG.warning("no dashboard pidfile %s, not reloaded" % pidfile_path)
+        return False
+    if not is_dashboard(pid):
+        # a stale pidfile, its pid may be reused, or a dashboard running in
+        # another container
+        LOG.warning("the pid %s is not a visible dashboard, not reloaded" % pid)
+        return False
+    try:
+        os.kill(pid, signal.SIGHUP)
+    except ProcessLookupError:
+        # the pidfile of a dashboard which did not stop cleanly
+        return False
+    except OSError as e:
+        LOG.error("unable to reload the dashboard %s: %s" % (pid, str(e)))
+        return False
+    LOG.info("reload the dashboard %s" % pid)
+    return True
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Optional SQLite store of the tests timings of all the topics.
+#
+# WORKING_DIR/timings.db holds the tables:
+#   - jobs (topic, job_id, created_at, file, tags)
+#   - job_tags (topic, tag, created_at, job_id)
+#   - timings (topic, job_id, created_at, testname, time)
+#   - topics (topic, manifest_mtime)
+# with indexes on (topic, created_at) and (topic, testname) for the
+# timings and on (topic, tag, created_at) for the tags, so the queries on
+# one test or on the jobs of a tag in a date range only read the matching
+# rows whatever the size of the topic.
+#
+# The sync writes it when enabled with its --sqlite option or the
+# DCI_ANALYSIS_SQLITE_STORE environment variable. The database is in WAL
+# mode, the dashboard reads it while a sync writes it.
+#
+# The topics table records the mtime of the manifest of each topic when it
+# was written to the database. Every sync rewrites the manifest, so a topic
+# synced later without the sqlite store has a different manifest mtime and
+# its queries fall back to the columnar store.
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from dci_analysis import manifest
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+DATABASE_FILE = "timings.db"
+
+ENABLED = os.getenv("DCI_ANALYSIS_SQLITE_STORE", "") not in ("", "0")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    topic TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    file TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    PRIMARY KEY (topic, job_id)
+);
+CREATE TABLE IF NOT EXISTS job_tags (
+    topic TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    job_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    topic TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    testname TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topics (
+    topic TEXT PRIMARY KEY,
+    manifest_mtime INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_tags_topic_tag_created_at
+    ON job_tags (topic, tag, created_at);
+CREATE INDEX IF NOT EXISTS timings_topic_created_at
+    ON timings (topic, created_at);
+CREATE INDEX IF NOT EXISTS timings_topic_testname
+    ON timings (topic, testname, created_at);
+"""
+
+
+def get_database_path(working_dir):
+    return "%s/%s" % (working_dir, DATABASE_FILE)
+
+
+def exists(working_dir):
+    return os.path.exists(get_database_path(working_dir))
+
+
+def connect(working_dir, read_only=False):
+    database_path = get_database_path(working_dir)
+    if read_only:
+        return sqlite3.connect("file:%s?mode=ro" % database_path, uri=True)
+    conn = sqlite3.connect(database_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _read_csv(csv_file):
+    with open(csv_file, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) == 2:
+                yield row[0], float(row[1])
+
+
+def _get_manifest_mtime(working_dir, topic_name):
+    try:
+        return os.stat(manifest.get_manifest_path(working_dir, topic_name)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _insert_tags(conn, topic_name, job):
+    conn.executemany(
+        "INSERT INTO job_tags VALUES (?, ?, ?, ?)",
+        [(topic_name, tag, job["created_at"], job["id"]) for tag in job["tags"]],
+    )
+
+
+def _delete_jobs(conn, topic_name, jobs_ids, tables=("jobs", "job_tags", "timings")):
+    for table in tables:
+        conn.executemany(
+            "DELETE FROM %s WHERE topic = ? AND job_id = ?" % table,
+            [(topic_name, job_id) for job_id in jobs_ids],
+        )
+
+
+def update(working_dir, topic_name, jobs):
+    """Synchronize the database with the jobs, manifest entries, of the
+    topic in one transaction: the unknown jobs are added, the removed ones
+    deleted and the tags of the retagged ones replaced. Return the number
+    of added jobs."""
+    manifest_mtime = _get_manifest_mtime(working_dir, topic_name)
+    conn = connect(working_dir)
+    try:
+        rows = conn.execute(
+            "SELECT job_id, tags FROM jobs WHERE topic = ?", (topic_name,)
+        )
+        known_tags = dict((r[0], json.loads(r[1])) for r in rows)
+        jobs_ids = set(j["id"] for j in jobs)
+        new_jobs = [j for j in jobs if j["id"] not in known_tags]
+        retagged_jobs = [
+            j
+            for j in jobs
+            if j["id"] in known_tags and known_tags[j["id"]] != j["tags"]
+        ]
+        removed_jobs = [job_id for job_id in known_tags if job_id not in jobs_ids]
+        LOG.info(
+            "add %s jobs, retag %s jobs and remove %s jobs of the %s database"
+            % (len(new_jobs), len(retagged_jobs), len(removed_jobs), topic_name)
+        )
+        with conn:
+            _delete_jobs(conn, topic_name, removed_jobs)
+            _delete_jobs(
+                conn, topic_name, [j["id"] for j in retagged_jobs], ("job_tags",)
+            )
+            for job in retagged_jobs:
+                conn.execute(
+                    "UPDATE jobs SET tags = ? WHERE topic = ? AND job_id = ?",
+                    (json.dumps(job["tags"]), topic_name, job["id"]),
+                )
+                _insert_tags(conn, topic_name, job)
+            for job in new_jobs:
+                csv_file = "%s/%s/%s" % (working_dir, topic_name, job["file"])
+                try:
+                    timings = [
+                        (topic_name, job["id"], job["created_at"], testname, time)
+                        for testname, time in _read_csv(csv_file)
+                    ]
+                except (OSError, ValueError) as e:
+                    LOG.error("unable to read %s: %s" % (csv_file, str(e)))
+                    continue
+                conn.execute(
+                    "INSERT INTO jobs VALUES (?, ?, ?, ?, ?)",
+                    (
+                        topic_name,
+                        job["id"],
+                        job["created_at"],
+                        job["file"],
+                        json.dumps(job["tags"]),
+                    ),
+                )
+                _insert_tags(conn, topic_name, job)
+                conn.executemany("INSERT INTO timings VALUES (?, ?, ?, ?, ?)", timings)
+            # the topic is only fresh if all its jobs are in the database
+            conn.execute("DELETE FROM topics WHERE topic = ?", (topic_name,))
+            nb_jobs = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE topic = ?", (topic_name,)
+            ).fetchone()[0]
+            if manifest_mtime is not None and nb_jobs == len(jobs):
+                conn.execute(
+                    "INSERT INTO topics VALUES (?, ?)", (topic_name, manifest_mtime)
+                )
+        return len(new_jobs)
+    finally:
+        conn.close()
+
+
+def is_fresh(working_dir, topic_name):
+    """Return True if the database has the jobs of the current manifest of
+    the topic."""
+    if not exists(working_dir):
+        return False
+    manifest_mtime = _get_manifest_mtime(working_dir, topic_name)
+    conn = connect(working_dir, read_only=True)
+    try:
+        row = conn.execute(
+            "SELECT manifest_mtime FROM topics WHERE topic = ?", (topic_name,)
+        ).fetchone()
+        return row is not None and row[0] == manifest_mtime
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def remove_topic(working_dir, topic_name):
+    if not exists(working_dir):
+        return
+    conn = connect(working_dir)
+    try:
+        with conn:
+            for table in ("jobs", "job_tags", "timings", "topics"):
+                conn.execute("DELETE FROM %s WHERE topic = ?" % table, (topic_name,))
+    finally:
+        conn.close()
+
+
+def _date_range(start_date, end_date):
+    # created_at are iso formatted, the end date includes its whole day
+    start = start_date.strftime("%Y-%m-%d") if start_date else ""
+    end = "%sT99" % end_date.strftime("%Y-%m-%d") if end_date else "9999"
+    return start, end
+
+
+def get_test_history(working_dir, topic_name, testname, start_date=None, end_date=None):
+    """Return the (job_id, created_at, time) of the test in the jobs of the
+    topic created between the dates, sorted by date."""
+    start, end = _date_range(start_date, end_date)
+    conn = connect(working_dir, read_only=True)
+    try:
+        return conn.execute(
+            "SELECT job_id, created_at, time FROM timings "
+            "WHERE topic = ? AND testname = ? AND created_at BETWEEN ? AND ? "
+            "ORDER BY created_at",
+            (topic_name, testname, start, end),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_jobs_with_tag(working_dir, topic_name, tag, start_date=None, end_date=None):
+    """Return the (job_id, created_at) of the jobs of the topic having the
+    tag and created between the dates, sorted by date."""
+    start, end = _date_range(start_date, end_date)
+    conn = connect(working_dir, read_only=True)
+    try:
+        return conn.execute(
+            "SELECT job_id, created_at FROM job_tags "
+            "WHERE topic = ? AND tag = ? AND created_at BETWEEN ? AND ? "
+            "ORDER BY created_at",
+            (topic_name, tag, start, end),
+        ).fetchall()
+    finally:
+        conn.close()
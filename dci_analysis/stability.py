@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Stability profile of the tests of a topic.
+#
+# The sync keeps in TOPIC/store/stability.json, for each combination of
+# tags of the jobs, the statistics of each test over the jobs having
+# exactly these tags: the number of jobs running it, its mean and the sum
+# of the squared differences to the mean (M2), updated with the new jobs
+# only, and its median and median absolute deviation (MAD).
+#
+# The statistics of several combinations are merged exactly for the count,
+# mean and variance, the median and the MAD of a merge are the average of
+# the ones of the combinations weighted by their counts, an estimate.
+#
+# The rows of the statistics are the ones of the store matrix, the store
+# only appends new tests so the profile follows it, a profile whose tests
+# are not a prefix of the store tests is rebuilt.
+
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy
+import pandas as pd
+
+from dci_analysis import store
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+STABILITY_FILE = "stability.json"
+
+# loaded profiles per path, with the mtime of the file
+_PROFILES = {}
+_PROFILES_LOCK = threading.Lock()
+
+
+def get_tags_key(tags):
+    return ",".join(sorted(set(tags)))
+
+
+class TestsStats(object):
+    """Statistics of the tests over a set of jobs, arrays indexed by the
+    rows of the store matrix."""
+
+    def __init__(self, nb_jobs, count, mean, m2, median, mad):
+        self.nb_jobs = nb_jobs
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.median = median
+        self.mad = mad
+
+    @classmethod
+    def empty(cls, nb_tests):
+        zeros = numpy.zeros(nb_tests)
+        nans = numpy.full(nb_tests, numpy.nan)
+        return cls(0, zeros, zeros.copy(), zeros.copy(), nans, nans.copy())
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Compute the statistics of the (tests x jobs) matrix, NaN are the
+        tests not run by a job."""
+        count = numpy.count_nonzero(~numpy.isnan(matrix), axis=1).astype(float)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            mean = numpy.where(count > 0, numpy.nansum(matrix, axis=1) / count, 0.0)
+            m2 = numpy.nansum((matrix - mean[:, numpy.newaxis]) ** 2, axis=1)
+        median, mad = cls._median_mad(matrix, count)
+        return cls(matrix.shape[1], count, mean, m2, median, mad)
+
+    @staticmethod
+    def _median_mad(matrix, count):
+        median = numpy.full(matrix.shape[0], numpy.nan)
+        mad = numpy.full(matrix.shape[0], numpy.nan)
+        rows = count > 0
+        if matrix.shape[1] and rows.any():
+            median[rows] = numpy.nanmedian(matrix[rows], axis=1)
+            mad[rows] = numpy.nanmedian(
+                numpy.abs(matrix[rows] - median[rows, numpy.newaxis]), axis=1
+            )
+        return median, mad
+
+    def resize(self, nb_tests):
+        """Extend the statistics to the new tests appended to the store."""
+        extra = nb_tests - len(self.count)
+        if extra <= 0:
+            return self
+        zeros = numpy.zeros(extra)
+        nans = numpy.full(extra, numpy.nan)
+        return TestsStats(
+            self.nb_jobs,
+            numpy.concatenate([self.count, zeros]),
+            numpy.concatenate([self.mean, zeros]),
+            numpy.concatenate([self.m2, zeros]),
+            numpy.concatenate([self.median, nans]),
+            numpy.concatenate([self.mad, nans]),
+        )
+
+    def merge(self, other):
+        """Return the statistics of the union of the two sets of jobs."""
+        count = self.count + other.count
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            delta = other.mean - self.mean
+            mean = numpy.where(count > 0, self.mean + delta * other.count / count, 0.0)
+            m2 = numpy.where(
+                count > 0,
+                self.m2 + other.m2 + delta**2 * self.count * other.count / count,
+                0.0,
+            )
+        return TestsStats(
+            self.nb_jobs + other.nb_jobs,
+            count,
+            mean,
+            m2,
+            self._weighted(self.median, other.median, other.count, count),
+            self._weighted(self.mad, other.mad, other.count, count),
+        )
+
+    def _weighted(self, values, other_values, other_count, count):
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            merged = (
+                numpy.nan_to_num(values) * self.count
+                + numpy.nan_to_num(other_values) * other_count
+            ) / count
+        return numpy.where(count > 0, merged, numpy.nan)
+
+    def to_dict(self):
+        return {
+            "nb_jobs": self.nb_jobs,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "median": self.median.tolist(),
+            "mad": self.mad.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["nb_jobs"],
+            *[
+                numpy.asarray(data[k], dtype=float)
+                for k in ("count", "mean", "m2", "median", "mad")
+            ]
+        )
+
+
+class StabilityProfile(object):
+    def __init__(self, tests, jobs, tags, stats):
+        # jobs maps the store files counted in the statistics to their tags
+        # combination key, tags maps a key to its tags and stats to its
+        # TestsStats
+        self.tests = tests
+        self.jobs = jobs
+        self.tags = tags
+        self.stats = stats
+
+    def select(self, tags_keys):
+        """Merge the statistics of the tags combinations."""
+        merged = TestsStats.empty(len(self.tests))
+        for key in tags_keys:
+            merged = merged.merge(self.stats[key])
+        return merged
+
+    def get_coefficient_variation(self, tags_keys):
+        """Return the Series of the coefficient of variation of the tests
+        run by all the jobs of the tags combinations."""
+        stats = self.select(tags_keys)
+        rows = (stats.count == stats.nb_jobs) & (stats.count > 0)
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            std = numpy.sqrt(stats.m2[rows] / stats.count[rows])
+            coeff_var = std / stats.mean[rows]
+        tests = [t for t, row in zip(self.tests, rows) if row]
+        return pd.Series(coeff_var, index=pd.Index(tests, name="testname"))
+
+    def to_dict(self):
+        return {
+            "tests": self.tests,
+            "jobs": self.jobs,
+            "tags": self.tags,
+            "stats": {key: stats.to_dict() for key, stats in self.stats.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = {k: TestsStats.from_dict(s) for k, s in data["stats"].items()}
+        return cls(data["tests"], data["jobs"], data["tags"], stats)
+
+
+def get_stability_path(working_dir, topic_name):
+    return "%s/%s" % (store.get_store_path(working_dir, topic_name), STABILITY_FILE)
+
+
+def _read(stability_path):
+    try:
+        with open(stability_path, "r") as f:
+            return StabilityProfile.from_dict(json.loads(f.read()))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write(stability_path, profile):
+    tmp_path = "%s.tmp" % stability_path
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(profile.to_dict()))
+    os.replace(tmp_path, stability_path)
+
+
+def update(working_dir, topic_name):
+    """Add the jobs of the store which are not yet in the profile, only the
+    statistics of the tags combinations of the new jobs are updated."""
+    tests, jobs, matrix = store._load(store.get_store_path(working_dir, topic_name))
+    if matrix is None:
+        return None
+    stability_path = get_stability_path(working_dir, topic_name)
+    profile = _read(stability_path)
+    jobs_keys = dict((job["file"], get_tags_key(job["tags"])) for job in jobs)
+    # a profile of another store or with retagged jobs is rebuilt
+    if (
+        profile is None
+        or tests[: len(profile.tests)] != profile.tests
+        or any(jobs_keys.get(f) != key for f, key in profile.jobs.items())
+    ):
+        profile = StabilityProfile([], {}, {}, {})
+
+    columns_of_key = {}
+    new_columns = {}
+    for i, job in enumerate(jobs):
+        key = jobs_keys[job["file"]]
+        columns_of_key.setdefault(key, []).append(i)
+        if job["file"] not in profile.jobs:
+            new_columns.setdefault(key, []).append(i)
+            profile.tags[key] = sorted(set(job["tags"]))
+    if not new_columns and profile.tests == tests:
+        return profile
+    LOG.info(
+        "update %s stability profile with %s jobs"
+        % (topic_name, sum(len(c) for c in new_columns.values()))
+    )
+
+    for key in profile.stats:
+        profile.stats[key] = profile.stats[key].resize(len(tests))
+    for key, columns in new_columns.items():
+        stats = profile.stats.get(key, TestsStats.empty(len(tests)))
+        stats = stats.merge(TestsStats.from_matrix(numpy.array(matrix[:, columns])))
+        # the median and the MAD are recomputed over all the jobs of the
+        # combination
+        stats.median, stats.mad = TestsStats._median_mad(
+            numpy.array(matrix[:, columns_of_key[key]]), stats.count
+        )
+        profile.stats[key] = stats
+    profile.tests = tests
+    profile.jobs = jobs_keys
+    try:
+        _write(stability_path, profile)
+    except OSError as e:
+        LOG.error("unable to write %s stability profile: %s" % (topic_name, str(e)))
+    return profile
+
+
+def load(working_dir, topic_name):
+    """Return the stability profile of the topic or None if it is missing
+    or older than the store."""
+    stability_path = get_stability_path(working_dir, topic_name)
+    jobs_path = "%s/jobs.json" % store.get_store_path(working_dir, topic_name)
+    try:
+        mtime = os.stat(stability_path).st_mtime_ns
+        if mtime < os.stat(jobs_path).st_mtime_ns:
+            return None
+    except OSError:
+        return None
+    with _PROFILES_LOCK:
+        loaded = _PROFILES.get(stability_path)
+        if loaded is not None and loaded[0] == mtime:
+            return loaded[1]
+        profile = _read(stability_path)
+        if profile is not None:
+            _PROFILES[stability_path] = (mtime, profile)
+        return profile
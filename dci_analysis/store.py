@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Columnar store of the tests timings of a topic.
+#
+# Each topic directory gets a store/ sub directory with:
+#   - tests.json: the test names, the position of a name is its matrix row
+#   - jobs.json: the jobs metadata sorted by date and creation time, as in
+#     the manifest, the position of a job is its matrix column
+#   - timings.npy: a (tests x jobs) float64 matrix in column major order,
+#     missing timings are NaN
+#   - tests_timings.npy: the same matrix in row major order
+#
+# The matrices are memory mapped, the timings of a job are a contiguous
+# column of timings.npy and the history of a test a contiguous row of
+# tests_timings.npy, found with the positions of the test names, so
+# reading one job or one test does not depend on the size of the topic.
+
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy
+import pandas as pd
+
+from dci_analysis import loader
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+STORE_DIR = "store"
+
+# positions of the test names per tests.json path, with its mtime
+_TESTS_POSITIONS = {}
+_TESTS_POSITIONS_LOCK = threading.Lock()
+
+
+def get_store_path(working_dir, topic_name):
+    return "%s/%s/%s" % (working_dir, topic_name, STORE_DIR)
+
+
+def _write_json(path, data):
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.loads(f.read())
+
+
+def _write_matrix(path, matrix, order="F"):
+    tmp_path = "%s.tmp.npy" % path[: -len(".npy")]
+    numpy.save(tmp_path, numpy.asarray(matrix, order=order))
+    os.replace(tmp_path, path)
+
+
+def _load(store_path):
+    tests = _read_json("%s/tests.json" % store_path)
+    jobs = _read_json("%s/jobs.json" % store_path)
+    matrix = numpy.load("%s/timings.npy" % store_path, mmap_mode="r")
+    if matrix.shape != (len(tests), len(jobs)):
+        LOG.error("inconsistent store %s, ignoring it" % store_path)
+        return None, None, None
+    return tests, jobs, matrix
+
+
+def is_fresh(working_dir, topic_name):
+    """The store is fresh when it has been written after the last change
+    of the topic directory."""
+    store_path = get_store_path(working_dir, topic_name)
+    jobs_path = "%s/jobs.json" % store_path
+    if not os.path.exists(jobs_path):
+        return False
+    topic_path = "%s/%s" % (working_dir, topic_name)
+    return os.stat(jobs_path).st_mtime_ns >= os.stat(topic_path).st_mtime_ns
+
+
+def get_jobs(working_dir, topic_name):
+    """Return the jobs metadata of the topic sorted by date or None if
+    there is no usable store."""
+    if not is_fresh(working_dir, topic_name):
+        return None
+    try:
+        return _read_json("%s/jobs.json" % get_store_path(working_dir, topic_name))
+    except (OSError, ValueError):
+        return None
+
+
+def read_jobs(working_dir, topic_name, jobs_indexes):
+    """Read the timings of the jobs at the given positions, only the tests
+    shared by all the jobs are kept."""
+    store_path = get_store_path(working_dir, topic_name)
+    tests, jobs, matrix = _load(store_path)
+    if matrix is None:
+        return None
+    data = numpy.array(matrix[:, jobs_indexes])
+    jobs_dataset = pd.DataFrame(
+        data,
+        index=pd.Index(tests, name="testname"),
+        columns=[jobs[i]["id"] for i in jobs_indexes],
+    )
+    return jobs_dataset.dropna(how="any")
+
+
+def update(working_dir, topic_name, jobs_tags, manifest_jobs=None):
+    """Add the csv files of the topic which are not yet in the store and
+    refresh the tags of the jobs, their creation times come from the
+    manifest jobs."""
+    store_path = get_store_path(working_dir, topic_name)
+    os.makedirs(store_path, exist_ok=True)
+
+    tests, jobs, matrix = [], [], numpy.empty((0, 0))
+    if os.path.exists("%s/jobs.json" % store_path):
+        tests, jobs, matrix = _load(store_path)
+        if matrix is None:
+            tests, jobs, matrix = [], [], numpy.empty((0, 0))
+
+    created_at = dict((j["file"], j["created_at"]) for j in manifest_jobs or [])
+    known_files = set(j["file"] for j in jobs)
+    csv_files = [
+        cf
+        for cf in glob.glob("%s/%s/*.csv" % (working_dir, topic_name))
+        if os.path.basename(cf) not in known_files
+    ]
+    new_dataset, loaded_files, _ = loader.read_csv_files(csv_files, join="outer")
+    new_jobs = []
+    for cf in loaded_files:
+        file_name = os.path.basename(cf)
+        date, job_id = file_name.split("_")[:2]
+        new_jobs.append(
+            {
+                "id": job_id,
+                "date": date,
+                "created_at": created_at.get(file_name, date),
+                "file": file_name,
+                "tags": jobs_tags.get(file_name, []),
+            }
+        )
+
+    for job in jobs:
+        job["tags"] = jobs_tags.get(job["file"], job["tags"])
+        job["created_at"] = created_at.get(
+            job["file"], job.get("created_at", job["date"])
+        )
+
+    # the jobs of a day are sorted by creation time, as in the manifest
+    all_jobs = jobs + new_jobs
+    order = sorted(
+        range(len(all_jobs)),
+        key=lambda i: (all_jobs[i]["date"], all_jobs[i]["created_at"]),
+    )
+    if new_jobs or order != list(range(len(jobs))):
+        LOG.info("add %s jobs to the %s store" % (len(new_jobs), topic_name))
+        tests_positions = {t: i for i, t in enumerate(tests)}
+        new_tests = new_dataset.index if new_jobs else []
+        for testname in new_tests:
+            if testname not in tests_positions:
+                tests_positions[testname] = len(tests)
+                tests.append(testname)
+
+        new_matrix = numpy.full((len(tests), len(all_jobs)), numpy.nan)
+        new_matrix[: matrix.shape[0], : matrix.shape[1]] = matrix
+        if new_jobs:
+            rows = [tests_positions[t] for t in new_tests]
+            new_matrix[numpy.ix_(rows, range(len(jobs), len(all_jobs)))] = (
+                new_dataset.values
+            )
+
+        jobs = [all_jobs[i] for i in order]
+        matrix = new_matrix[:, order]
+        _write_matrix("%s/timings.npy" % store_path, matrix)
+        _write_matrix("%s/tests_timings.npy" % store_path, matrix, order="C")
+        _write_json("%s/tests.json" % store_path, tests)
+    elif jobs and not os.path.exists("%s/tests_timings.npy" % store_path):
+        _write_matrix("%s/tests_timings.npy" % store_path, matrix, order="C")
+
+    # jobs.json is written last, it marks the store as fresh
+    _write_json("%s/jobs.json" % store_path, jobs)
+
+
+def get_tests_positions(working_dir, topic_name):
+    """Return the mapping of the test names of the store to their rows."""
+    tests_path = "%s/tests.json" % get_store_path(working_dir, topic_name)
+    mtime = os.stat(tests_path).st_mtime_ns
+    with _TESTS_POSITIONS_LOCK:
+        loaded = _TESTS_POSITIONS.get(tests_path)
+        if loaded is None or loaded[0] != mtime:
+            tests = _read_json(tests_path)
+            loaded = (mtime, {t: i for i, t in enumerate(tests)})
+            _TESTS_POSITIONS[tests_path] = loaded
+        return loaded[1]
+
+
+def read_test(working_dir, topic_name, testname):
+    """Return the timings of the test in all the jobs, NaN where a job did
+    not run it, or None if the store does not know the test."""
+    store_path = get_store_path(working_dir, topic_name)
+    try:
+        row = get_tests_positions(working_dir, topic_name).get(testname)
+    except (OSError, ValueError):
+        return None
+    if row is None:
+        return None
+    tests_timings_path = "%s/tests_timings.npy" % store_path
+    if not os.path.exists(tests_timings_path):
+        # store written before the row major matrix
+        matrix = numpy.load("%s/timings.npy" % store_path, mmap_mode="r")
+    else:
+        matrix = numpy.load(tests_timings_path, mmap_mode="r")
+    if row >= matrix.shape[0]:
+        return None
+    return numpy.array(matrix[row, :])
+
+
+def read_job(working_dir, topic_name, job_index):
+    """Return the test names and the timings of the job at the position, the
+    tests the job did not run are dropped."""
+    tests, jobs, matrix = _load(get_store_path(working_dir, topic_name))
+    if matrix is None:
+        return None
+    timings = pd.Series(
+        numpy.array(matrix[:, job_index]), index=pd.Index(tests, name="testname")
+    )
+    return timings.dropna()
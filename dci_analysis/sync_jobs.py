@@ -17,12 +17,27 @@
 import concurrent.futures
 
 from lxml import etree
+import io
+import itertools
 import json
 import logging
 import os
 import requests
+import requests.adapters
+import shutil
 import sys
-
+import threading
+import time
+
+from dci_analysis import junit_cache
+from dci_analysis import manifest
+from dci_analysis import retry
+from dci_analysis import rollups
+from dci_analysis import sqlite_store
+from dci_analysis import stability
+from dci_analysis import store
+from dci_analysis import tags_index
+from dci_analysis import tags_log
 
 LOG = logging.getLogger(__name__)
 
@@ -34,21 +49,82 @@ LOG.setLevel(logging.DEBUG)
 
 HTTP_TIMEOUT = 600
 
+# retries and rate of the api requests, see configure_retry
+RETRY_POLICY = retry.RetryPolicy()
+RATE_LIMITER = retry.TokenBucket()
+
+# number of jobs downloaded concurrently, each worker keeps its connection
+# to the API alive in the session pool
+DEFAULT_WORKERS = 16
+
+# jobs with less tests are incomplete runs, they are not analyzed
+MIN_TESTS = 697
+
+# jobs per page of the listing and pages fetched concurrently
+JOBS_PAGE_SIZE = 100
+LISTING_WORKERS = 8
+
+
+def configure_session(dci_context, workers=DEFAULT_WORKERS):
+    """Share one pool of keep-alive connections, bounded per host, between
+    all the download workers."""
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=workers, pool_maxsize=workers, pool_block=True
+    )
+    dci_context.session.mount("https://", adapter)
+    dci_context.session.mount("http://", adapter)
+
+
+def configure_retry(timeout=None, nb_retry=None, rate_limit=None):
+    """Configure the retries and the requests rate shared by all the sync
+    workers, rate_limit is in requests per second."""
+    global RETRY_POLICY, RATE_LIMITER
+    RETRY_POLICY = retry.RetryPolicy(
+        nb_retry=nb_retry or RETRY_POLICY.nb_retry,
+        timeout=timeout or RETRY_POLICY.timeout,
+    )
+    RATE_LIMITER = retry.TokenBucket(rate_limit)
 
-def get_with_retry(dci_context, uri, timeout=5, nb_retry=5):
+
+def get_with_retry(dci_context, uri, timeout=None, nb_retry=None, stream=False):
+    """Return the response of the last attempt, the exception of the last
+    attempt is raised if it failed without a response."""
+    timeout = timeout or RETRY_POLICY.timeout
+    nb_retry = nb_retry or RETRY_POLICY.nb_retry
     res = None
+    error = None
     for i in range(nb_retry):
+        # the response and the error of a previous attempt are never reported
+        res = None
+        error = None
+        retry_after = None
+        RATE_LIMITER.acquire()
         try:
-            res = dci_context.session.get(uri, timeout=5)
-            if res.status_code != 200:
-                raise Exception('api issue')
-            break
-        except requests.exceptions.Timeout:
+            res = dci_context.session.get(uri, timeout=timeout, stream=stream)
+            if res.status_code == 200 or res.status_code not in retry.RETRY_STATUSES:
+                return res
+            LOG.info(
+                "api error code %s, text: %s, on %s, retrying..."
+                % (res.status_code, res.text, uri)
+            )
+            retry_after = retry.parse_retry_after(res.headers.get("Retry-After"))
+            if stream and i < nb_retry - 1:
+                res.close()
+        except requests.exceptions.Timeout as e:
+            error = e
             LOG.info("timeout on %s, retrying..." % uri)
-        except requests.ConnectionError:
+        except requests.ConnectionError as e:
+            error = e
             LOG.info("connection error on %s, retrying..." % uri)
-        except Exception:
-            LOG.info("api error code %s, text: %s, on %s, retrying..." % (res.status_code, res.text, uri))
+        if i == nb_retry - 1:
+            break
+        delay = RETRY_POLICY.get_delay(i, retry_after)
+        if res is not None and res.status_code in (429, 503):
+            # the api is overloaded, every worker backs off
+            RATE_LIMITER.pause(delay)
+        time.sleep(delay)
+    if error is not None:
+        raise error
     return res
 
 
@@ -86,7 +162,7 @@ def get_topics_of_product(dci_context, product_id):
             % (product_id, res.status_code, res.text)
         )
     _results = []
-    for t in es.json()["product"]["topics"]:
+    for t in res.json()["product"]["topics"]:
         if t['state'] == 'active':
             _results.append(t)
     return _results
@@ -106,31 +182,81 @@ def get_topic_id(dci_context, topic_name):
     return res.json()["topics"][0]["id"]
 
 
-def get_jobs(dci_context, team_id, topic_id):
-    jobs = []
-    limit = 100
-    offset = 0
-    total_jobs = None
-
-    while total_jobs is None or offset < total_jobs:
-        uri = (
-            f"{dci_context.dci_cs_api}/jobs?limit={limit}&offset={offset}&sort=-created_at"
-            f"&where=status:success,team_id:{team_id},topic_id:{topic_id}"
-        )
+def get_jobs_page(dci_context, team_id, topic_id, offset, limit=JOBS_PAGE_SIZE):
+    """Return the page of successful jobs at the offset, None if it cannot
+    be fetched."""
+    uri = (
+        f"{dci_context.dci_cs_api}/jobs?limit={limit}&offset={offset}&sort=-created_at"
+        f"&where=status:success,team_id:{team_id},topic_id:{topic_id}"
+    )
+    try:
         res = get_with_retry(dci_context, uri)
-
-        if res is not None and res.status_code != 200:
-            LOG.error(f"status: {res.status_code}, message: {res.text}")
-            return []
-
-        data = res.json()
-        if total_jobs is None:
-            total_jobs = data["_meta"]["count"]
-
-        jobs.extend(data["jobs"])
-        offset += limit
-
-    return jobs
+        if res is None or res.status_code != 200:
+            LOG.error(
+                "jobs page at offset %s: status: %s, message: %s"
+                % (offset, getattr(res, "status_code", None), getattr(res, "text", ""))
+            )
+            return None
+        return res.json()
+    except Exception:
+        LOG.exception("failed to get the jobs page at offset %s" % offset)
+        return None
+
+
+def get_jobs(dci_context, team_id, topic_id, since=None):
+    """Return the successful jobs of the topic, newest first, and the gaps
+    of the listing.
+
+    The first page gives the number of jobs, the other pages are fetched
+    concurrently by windows of LISTING_WORKERS pages. since is the sync
+    state of the last synced job, the listing stops at the window which
+    reaches it.
+
+    A page which still fails after its retries does not discard the other
+    pages, its position is returned in gaps, the indexes in jobs of the
+    first job following each missing page.
+    """
+    jobs = []
+    gaps = []
+    jobs_ids = set()
+
+    def add_page(page):
+        for job in page["jobs"]:
+            if since is not None and (
+                job["id"] == since["job_id"] or job["created_at"] < since["created_at"]
+            ):
+                LOG.info("reached the already synced job %s" % since["job_id"])
+                return True
+            # the jobs created during the listing shift the offsets, the
+            # jobs at the end of a page are listed again by the next one
+            if job["id"] in jobs_ids:
+                continue
+            jobs_ids.add(job["id"])
+            jobs.append(job)
+        return False
+
+    first_page = get_jobs_page(dci_context, team_id, topic_id, 0)
+    if first_page is None:
+        return [], [0]
+    if add_page(first_page):
+        return jobs, gaps
+    total_jobs = first_page["_meta"]["count"]
+    offsets = list(range(JOBS_PAGE_SIZE, total_jobs, JOBS_PAGE_SIZE))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=LISTING_WORKERS) as pool:
+        for i in range(0, len(offsets), LISTING_WORKERS):
+            window = offsets[i : i + LISTING_WORKERS]
+            pages = pool.map(
+                lambda offset: get_jobs_page(dci_context, team_id, topic_id, offset),
+                window,
+            )
+            # pool.map yields the pages in the order of their offsets
+            for page in pages:
+                if page is None:
+                    gaps.append(len(jobs))
+                elif add_page(page):
+                    return jobs, gaps
+    return jobs, gaps
 
 
 def get_files_of_job(dci_context, job_id, where=None):
@@ -140,26 +266,47 @@ def get_files_of_job(dci_context, job_id, where=None):
 
     res = get_with_retry(dci_context, uri)
 
-    if res is not None and res.status_code != 200:
-        LOG.error("status: %s, message: %s" % (res.status_code, res.text))
+    # a job whose files are unknown is failed, so the next sync retries it
+    if res is None or res.status_code != 200:
+        if res is not None:
+            LOG.error("status: %s, message: %s" % (res.status_code, res.text))
+        raise Exception("unable to get the files of job %s" % job_id)
     if "files" in res.json():
         return res.json()["files"]
     return []
 
 
+def iter_junit_tests(junit_file):
+    """Parse the junit file object incrementally and yield the (test key,
+    time) of the testcases of the root testsuites, the consumed elements
+    are freed as the parsing goes."""
+    tags = []
+    for event, element in etree.iterparse(junit_file, events=("start", "end")):
+        if event == "start":
+            tags.append(element.tag)
+            continue
+        if len(tags) == 3 and tags[1] == "testsuite" and element.get("time"):
+            key = "%s/%s" % (element.get("classname"), element.get("name"))
+            key = key.strip()
+            key = key.replace(",", "_")
+            yield key, float(element.get("time"))
+        tags.pop()
+        if len(tags) >= 1:
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
 def junit_to_dict(junit):
+    if isinstance(junit, str):
+        junit = junit.encode("utf-8")
     res = dict()
     try:
-        root = etree.fromstring(junit)
-        for testsuite in root.findall("testsuite"):
-            for tc in testsuite:
-                key = "%s/%s" % (tc.get("classname"), tc.get("name"))
-                key = key.strip()
-                key = key.replace(",", "_")
-                if tc.get("time"):
-                    res[key] = float(tc.get("time"))
+        for key, tc_time in iter_junit_tests(io.BytesIO(junit)):
+            res[key] = tc_time
     except etree.XMLSyntaxError as e:
         LOG.error("XMLSyntaxError %s" % str(e))
+        return dict()
     return res
 
 
@@ -177,17 +324,83 @@ def write_test_csv(job_id, test_path, test_dict):
             f.write("%s,%s\n" % (tc, test_dict[tc]))
 
 
+def write_junit_csv(job_id, test_path, junit_file, min_tests=0):
+    """Write the tests of the junit file object, parsed incrementally, to
+    the csv file.
+
+    The csv file is only written if the junit has at least min_tests
+    tests, return the number of tests.
+    """
+    # a job listed twice may be converted by two threads at once
+    tmp_test_path = "%s.%s.%s.tmp" % (test_path, os.getpid(), threading.get_ident())
+    nb_tests = 0
+    try:
+        # the last time of a duplicated test wins, as in junit_to_dict
+        tests = dict(iter_junit_tests(junit_file))
+        nb_tests = len(tests)
+        with open(tmp_test_path, "w") as f:
+            f.write("testname,%s\n" % job_id)
+            for key, tc_time in tests.items():
+                f.write("%s,%s\n" % (key, tc_time))
+        if nb_tests >= min_tests:
+            os.replace(tmp_test_path, test_path)
+    except etree.XMLSyntaxError as e:
+        LOG.error("XMLSyntaxError %s" % str(e))
+        nb_tests = 0
+    finally:
+        if os.path.exists(tmp_test_path):
+            os.remove(tmp_test_path)
+    return nb_tests
+
+
 def write_test_json(job_id, test_path, test_json):
     with open(test_path, "w") as f:
         f.write(json.dumps(test_json, indent=4))
 
 
 def get_junit_of_file(dci_context, file_id):
+    """Return the streamed response of the junit file, its raw attribute
+    is the decoded content file object."""
     uri = "%s/files/%s/content" % (dci_context.dci_cs_api, file_id)
-    res = get_with_retry(dci_context, uri)
-    if res is not None and res.status_code != 200:
+    res = get_with_retry(dci_context, uri, stream=True)
+    if res is None or res.status_code != 200:
         LOG.error("file not found: %s" % file_id)
-    return res.text
+        raise Exception("unable to download file %s" % file_id)
+    res.raw.decode_content = True
+    return res
+
+
+def convert_junit_file(dci_context, job, file_id, working_dir, topic_name, test_name):
+    """Convert the junit file of the job to its csv file, the file is read
+    from the junit cache or downloaded and cached, return the number of
+    tests."""
+    test_path = get_test_path(working_dir, topic_name, job, test_name)
+    if junit_cache.contains(working_dir, file_id):
+        LOG.info("convert cached junit file %s of job %s" % (file_id, job["id"]))
+        with junit_cache.open_entry(working_dir, file_id) as f:
+            return write_junit_csv(job["id"], test_path, f, MIN_TESTS)
+
+    LOG.info("download file %s of job %s" % (file_id, job["id"]))
+    res = get_junit_of_file(dci_context, file_id)
+    metadata = {
+        "job": {
+            "id": job["id"],
+            "created_at": job["created_at"],
+            "tags": job["tags"],
+        },
+        "topic": topic_name,
+        "test_name": test_name,
+    }
+    writer = junit_cache.CacheWriter(working_dir, file_id, res.raw, metadata)
+    LOG.info("convert junit job %s to csv" % job["id"])
+    try:
+        nb_tests = write_junit_csv(job["id"], test_path, writer, MIN_TESTS)
+        if nb_tests > 0:
+            writer.commit()
+    finally:
+        writer.abort()
+        res.close()
+    return nb_tests
 
 
 def handle_job(dci_context, job, working_dir, topic_name, test_name):
@@ -203,49 +416,309 @@ def handle_job(dci_context, job, working_dir, topic_name, test_name):
         files = get_files_of_job(dci_context, job["id"], "name:%s" % test_name)
         for file in files:
             if file["name"] == test_name:
-                LOG.info("download file %s of job %s" % (file["id"], job["id"]))  # noqa
-                junit = get_junit_of_file(dci_context, file["id"])
-                LOG.info("convert junit job %s to csv" % job["id"])
-                test_dict = junit_to_dict(junit)
-                if len(test_dict.keys()) >= 697:
-                    write_test_csv(job["id"], test_path, test_dict)
+                nb_tests = convert_junit_file(
+                    dci_context, job, file["id"], working_dir, topic_name, test_name
+                )
+                if nb_tests >= MIN_TESTS:
                     base_test_path = os.path.basename(test_path)
                     jobs_tags[base_test_path] = job["tags"]
                 else:
-                    LOG.warn("job %s tests contains less than 697 tests" % job["id"])
+                    LOG.warn(
+                        "job %s tests contains less than %s tests"
+                        % (job["id"], MIN_TESTS)
+                    )
         return jobs_tags
 
 
-def sync(dci_context, team_name, topic_name, test_name, working_dir):
+def get_sync_state_path(working_dir, topic_name):
+    return "%s/sync_state.json" % store.get_store_path(working_dir, topic_name)
 
-    team_id = get_team_id(dci_context, team_name)
-    LOG.info("%s team id %s" % (team_name, team_id))
+
+def read_sync_state(working_dir, topic_name, team_name, test_name):
+    sync_state_path = get_sync_state_path(working_dir, topic_name)
+    if not os.path.exists(sync_state_path):
+        return None
+    with open(sync_state_path, "r") as f:
+        sync_state = json.loads(f.read())
+    return sync_state.get("%s/%s" % (team_name, test_name))
+
+
+def write_sync_state(working_dir, topic_name, team_name, test_name, job):
+    sync_state_path = get_sync_state_path(working_dir, topic_name)
+    sync_state = {}
+    if os.path.exists(sync_state_path):
+        with open(sync_state_path, "r") as f:
+            sync_state = json.loads(f.read())
+    sync_state["%s/%s" % (team_name, test_name)] = {
+        "created_at": job["created_at"],
+        "job_id": job["id"],
+    }
+    os.makedirs(os.path.dirname(sync_state_path), exist_ok=True)
+    with open("%s.tmp" % sync_state_path, "w") as f:
+        f.write(json.dumps(sync_state))
+    os.replace("%s.tmp" % sync_state_path, sync_state_path)
+
+
+class TopicSync(object):
+    """State of the sync of the jobs of one topic."""
+
+    def __init__(self, topic_name, jobs, listing_gaps=None):
+        self.topic_name = topic_name
+        self.jobs = jobs
+        self.listing_gaps = listing_gaps or []
+        self.pending = len(jobs)
+        self.jobs_tags = {}
+        self.failed_jobs = set()
+
+
+def get_topic_jobs(
+    dci_context, team_id, team_name, topic_name, test_name, working_dir, full=False
+):
     topic_id = get_topic_id(dci_context, topic_name)
     LOG.info("%s topic id %s" % (topic_name, topic_id))
-    LOG.info("getting jobs that succeeded...")
-    jobs = get_jobs(dci_context, team_id, topic_id)
-    jobs_tags = {}
+    since = None
+    if not full:
+        since = read_sync_state(working_dir, topic_name, team_name, test_name)
+    if since is not None:
+        LOG.info(
+            "getting %s jobs that succeeded since %s..."
+            % (topic_name, since["created_at"])
+        )
+    else:
+        LOG.info("getting %s jobs that succeeded..." % topic_name)
+    return get_jobs(dci_context, team_id, topic_id, since)
 
-    LOG.info("convert %s jobs tests to csv files..." % test_name)
 
-    futures = []
-    pool = concurrent.futures.ProcessPoolExecutor()
+def update_topic_indexes(
+    working_dir, topic_name, test_name, jobs, jobs_tags, removed_files=()
+):
+    """Append the tags of the new job files to the tags log and update the
+    tags index, the manifest and the store of the topic."""
+    tags_log.append(working_dir, topic_name, jobs_tags, removed_files)
+    file_jobs_tags = tags_log.read(working_dir, topic_name)
+
+    manifest_jobs = []
     for job in jobs:
-        future = pool.submit(
-            handle_job, dci_context, job, working_dir, topic_name, test_name
+        file_name = os.path.basename(
+            get_test_path(working_dir, topic_name, job, test_name)
         )
-        futures.append(future)
+        if file_name in jobs_tags:
+            manifest_jobs.append(
+                manifest.make_entry(
+                    working_dir,
+                    topic_name,
+                    file_name,
+                    job["tags"],
+                    job["created_at"],
+                )
+            )
+    LOG.info("update %s tags index..." % topic_name)
+    tags_index.update(working_dir, topic_name, file_jobs_tags)
+
+    LOG.info("update %s manifest..." % topic_name)
+    topic_manifest = manifest.build(
+        working_dir, topic_name, file_jobs_tags, manifest_jobs
+    )
+
+    LOG.info("update %s columnar store..." % topic_name)
+    store.update(working_dir, topic_name, file_jobs_tags, topic_manifest.jobs)
+
+    LOG.info("update %s stability profile..." % topic_name)
+    stability.update(working_dir, topic_name)
+
+    LOG.info("update %s daily rollups..." % topic_name)
+    rollups.update(working_dir, topic_name)
+
+    if sqlite_store.ENABLED:
+        LOG.info("update %s sqlite store..." % topic_name)
+        sqlite_store.update(working_dir, topic_name, topic_manifest.jobs)
+
+    tags_log.compact_in_background(working_dir, topic_name)
+
+
+def finalize_topic(working_dir, team_name, test_name, topic_sync):
+    """Update the indexes of the topic once all its jobs are handled."""
+    topic_name = topic_sync.topic_name
+    jobs = topic_sync.jobs
+    update_topic_indexes(working_dir, topic_name, test_name, jobs, topic_sync.jobs_tags)
+
+    # the next sync restarts from the newest job older than every failed
+    # job and every missing page of the listing, so they are retried
+    start = max(topic_sync.listing_gaps, default=0)
+    for i, job in enumerate(jobs):
+        if job["id"] in topic_sync.failed_jobs:
+            start = max(start, i + 1)
+    synced_jobs = jobs[start:]
+    if synced_jobs:
+        write_sync_state(working_dir, topic_name, team_name, test_name, synced_jobs[0])
+    LOG.info("%s done" % topic_name)
+
+
+def _finalize_topic(working_dir, team_name, test_name, topic_sync):
+    try:
+        finalize_topic(working_dir, team_name, test_name, topic_sync)
+    except Exception:
+        LOG.exception("failed to finalize topic %s" % topic_sync.topic_name)
+
+
+def sync_topics(
+    dci_context,
+    team_name,
+    topics_names,
+    test_name,
+    working_dir,
+    workers=DEFAULT_WORKERS,
+    full=False,
+):
+    """Sync the topics with one pool of workers.
+
+    The jobs of the topics are scheduled in a round robin so every topic
+    progresses at the same pace, the indexes of a topic are updated as
+    soon as all its jobs are handled.
+    """
+    team_id = get_team_id(dci_context, team_name)
+    LOG.info("%s team id %s" % (team_name, team_id))
 
-    for future in concurrent.futures.as_completed(futures):
-        if isinstance(future.result(), dict):
-            jobs_tags.update(future.result())
+    topics_syncs = []
+    for topic_name in topics_names:
+        LOG.info("create %s/%s/ directory" % (working_dir, topic_name))
+        os.makedirs("%s/%s" % (working_dir, topic_name), exist_ok=True)
+        try:
+            jobs, listing_gaps = get_topic_jobs(
+                dci_context,
+                team_id,
+                team_name,
+                topic_name,
+                test_name,
+                working_dir,
+                full,
+            )
+        except Exception:
+            LOG.exception("failed to get the jobs of topic %s" % topic_name)
+            continue
+        if listing_gaps:
+            LOG.error("the listing of topic %s is incomplete" % topic_name)
+        topics_syncs.append(TopicSync(topic_name, jobs, listing_gaps))
 
-    file_jobs_tags = {}
-    jobs_tags_file_path = "%s/%s/index_tags.json" % (working_dir, topic_name)
-    if os.path.exists(jobs_tags_file_path):
-        file_jobs_tags = open(jobs_tags_file_path, "r").read()
-        file_jobs_tags = json.loads(file_jobs_tags)
-    file_jobs_tags.update(jobs_tags)
+    LOG.info("convert %s jobs tests to csv files..." % test_name)
 
-    with open("%s/%s/index_tags.json" % (working_dir, topic_name), "w") as f:
-        f.write(json.dumps(file_jobs_tags))
+    # the work is network bound, threads share the dci_context session and
+    # its connections instead of pickling it into worker processes
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for topics_jobs in itertools.zip_longest(*[ts.jobs for ts in topics_syncs]):
+            for topic_sync, job in zip(topics_syncs, topics_jobs):
+                if job is None:
+                    continue
+                future = pool.submit(
+                    handle_job,
+                    dci_context,
+                    job,
+                    working_dir,
+                    topic_sync.topic_name,
+                    test_name,
+                )
+                futures[future] = (topic_sync, job)
+
+        for topic_sync in topics_syncs:
+            if topic_sync.pending == 0:
+                _finalize_topic(working_dir, team_name, test_name, topic_sync)
+
+        for future in concurrent.futures.as_completed(futures):
+            topic_sync, job = futures[future]
+            try:
+                result = future.result()
+                if isinstance(result, dict):
+                    topic_sync.jobs_tags.update(result)
+            except Exception:
+                LOG.exception("failed to handle job %s" % job["id"])
+                topic_sync.failed_jobs.add(job["id"])
+            topic_sync.pending -= 1
+            if topic_sync.pending == 0:
+                _finalize_topic(working_dir, team_name, test_name, topic_sync)
+
+    junit_cache.evict(working_dir)
+
+
+def sync(
+    dci_context,
+    team_name,
+    topic_name,
+    test_name,
+    working_dir,
+    workers=DEFAULT_WORKERS,
+    full=False,
+):
+    sync_topics(
+        dci_context, team_name, [topic_name], test_name, working_dir, workers, full
+    )
+
+
+def reconvert_entry(working_dir, metadata):
+    """Convert again the cached junit file to its csv file, the csv file is
+    removed if the junit has too few tests. Return the csv file name and
+    the number of tests."""
+    job = metadata["job"]
+    test_path = get_test_path(
+        working_dir, metadata["topic"], job, metadata["test_name"]
+    )
+    with junit_cache.open_entry(working_dir, metadata["file_id"]) as f:
+        nb_tests = write_junit_csv(job["id"], test_path, f, MIN_TESTS)
+    if nb_tests < MIN_TESTS and os.path.exists(test_path):
+        os.remove(test_path)
+    return os.path.basename(test_path), nb_tests
+
+
+def reconvert(working_dir, topics_names=None, workers=None):
+    """Rebuild the csv files and the indexes of the topics from the junit
+    cache, without the api.
+
+    The conversion is cpu bound, the cached files are converted by a pool
+    of processes.
+    """
+    entries = [
+        m
+        for m in junit_cache.iter_entries(working_dir)
+        if not topics_names or m["topic"] in topics_names
+    ]
+    LOG.info("reconvert %s cached junit files..." % len(entries))
+
+    topics = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(reconvert_entry, working_dir, m): m for m in entries}
+        for future in concurrent.futures.as_completed(futures):
+            metadata = futures[future]
+            topic = topics.setdefault(
+                (metadata["topic"], metadata["test_name"]), ([], {}, [])
+            )
+            try:
+                file_name, nb_tests = future.result()
+            except Exception:
+                LOG.exception("failed to reconvert file %s" % metadata["file_id"])
+                continue
+            if nb_tests >= MIN_TESTS:
+                topic[0].append(metadata["job"])
+                topic[1][file_name] = metadata["job"]["tags"]
+            else:
+                topic[2].append(file_name)
+
+    for (topic_name, test_name), (jobs, jobs_tags, removed_files) in topics.items():
+        LOG.info("rebuild %s indexes..." % topic_name)
+        # the csv files changed in place, the derived files are rebuilt
+        for path in (
+            "%s/jobs.json" % store.get_store_path(working_dir, topic_name),
+            manifest.get_manifest_path(working_dir, topic_name),
+            tags_index.get_tags_index_path(working_dir, topic_name),
+            stability.get_stability_path(working_dir, topic_name),
+        ):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(rollups.get_rollups_path(working_dir, topic_name), True)
+        if sqlite_store.ENABLED:
+            sqlite_store.remove_topic(working_dir, topic_name)
+        try:
+            update_topic_indexes(
+                working_dir, topic_name, test_name, jobs, jobs_tags, removed_files
+            )
+        except Exception:
+            LOG.exception("failed to rebuild %s indexes" % topic_name)
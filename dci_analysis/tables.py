@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Server side paging of the dashboard tables.
+#
+# The DataTables of the tests results are in custom paging, sorting and
+# filtering mode: the browser only sends its current page, its sort_by and
+# its filter_query, and only receives the rows of the page. The rows are
+# filtered, sorted and sliced from the DataFrame of the table here.
+
+import math
+import re
+
+
+# filter_query operators of the DataTables and the name of their comparison
+FILTER_OPERATORS = {
+    ">=": "ge",
+    "<=": "le",
+    "<": "lt",
+    ">": "gt",
+    "!=": "ne",
+    "=": "eq",
+    "ge": "ge",
+    "le": "le",
+    "lt": "lt",
+    "gt": "gt",
+    "ne": "ne",
+    "eq": "eq",
+    "contains": "contains",
+    "datestartswith": "datestartswith",
+}
+
+# a term is the {column} followed by its operator, with an optional case
+# sensitivity prefix, and the value, the operator is only looked for right
+# after the column so the values may contain operators
+FILTER_TERM = re.compile(
+    r"^\s*\{(?P<column>[^}]*)\}\s*[is]?"
+    r"(?P<operator>>=|<=|!=|<|>|=|(?:ge|le|lt|gt|ne|eq|contains|datestartswith)\b)"
+    r"\s*(?P<value>.*?)\s*$"
+)
+
+
+def split_filter_part(filter_part):
+    """Return the (column, operator, value) of a filter_query term, like
+    "{value} >= 0.5", or (None, None, None) if it is not supported."""
+    match = FILTER_TERM.match(filter_part)
+    if match is None:
+        return None, None, None
+    value_part = match.group("value")
+    quote = value_part[:1]
+    if quote in ("'", '"', "`") and len(value_part) > 1 and value_part[-1] == quote:
+        value = value_part[1:-1].replace("\\" + quote, quote)
+    else:
+        try:
+            value = float(value_part)
+        except ValueError:
+            value = value_part
+    return match.group("column"), FILTER_OPERATORS[match.group("operator")], value
+
+
+def filter_frame(frame, filter_query):
+    """Keep the rows of the DataFrame matching all the terms of the query,
+    the unsupported terms are ignored."""
+    if not filter_query:
+        return frame
+    for filter_part in filter_query.split(" && "):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in frame.columns:
+            continue
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            try:
+                frame = frame.loc[getattr(frame[column], operator)(value)]
+            except TypeError:
+                # a text compared with the numbers of a column
+                frame = frame.iloc[0:0]
+        elif operator == "contains":
+            values = frame[column].astype(str)
+            frame = frame.loc[values.str.contains(str(value), regex=False)]
+        elif operator == "datestartswith":
+            values = frame[column].astype(str)
+            frame = frame.loc[values.str.startswith(str(value))]
+    return frame
+
+
+def sort_frame(frame, sort_by):
+    """Sort the DataFrame by the sort_by columns of a DataTable."""
+    sort_by = [s for s in sort_by or [] if s["column_id"] in frame.columns]
+    if not sort_by:
+        return frame
+    return frame.sort_values(
+        [s["column_id"] for s in sort_by],
+        ascending=[s["direction"] == "asc" for s in sort_by],
+        kind="stable",
+    )
+
+
+def get_page(frame, page_current, page_size, sort_by=None, filter_query=None):
+    """Return the records of the current page of the filtered and sorted
+    DataFrame and the number of pages."""
+    frame = sort_frame(filter_frame(frame, filter_query), sort_by)
+    page_current = page_current or 0
+    page_count = max(int(math.ceil(len(frame) / float(page_size))), 1)
+    start = page_current * page_size
+    return frame.iloc[start : start + page_size].to_dict("records"), page_count
+
+
+def series_to_frame(series, column="value"):
+    """Return the DataFrame of the testcase and value columns of a Series
+    indexed by the test names."""
+    return series.rename(column).rename_axis("testcase").reset_index()
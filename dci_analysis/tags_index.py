@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Inverted index from the tags to the jobs of a topic.
+#
+# Each job file gets an ordinal, its position in the "jobs" list, and each
+# tag maps to a bitmap of the ordinals of its jobs. The bitmaps are python
+# integers, stored as hexadecimal strings, so a tags expression is
+# evaluated with a few bitwise operations whatever the number of jobs.
+#
+# A tags expression is a list of terms which must all match, a term is a
+# tag or several alternative tags separated by "|", a "!" prefix negates
+# the whole term: ["x86_64", "!debug|kernel-rt"] selects the x86_64 jobs
+# which have neither the debug nor the kernel-rt tag.
+
+import json
+import logging
+import os
+import sys
+import threading
+
+from dci_analysis import store
+from dci_analysis import tags_log
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+TAGS_INDEX_FILE = "tags_index.json"
+
+# loaded indexes per topic path, with the mtime of the file they come from
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+class TagsIndex(object):
+    def __init__(self, jobs, bitmaps):
+        self.jobs = jobs
+        self.bitmaps = bitmaps
+        self.all_jobs = (1 << len(jobs)) - 1
+
+    @classmethod
+    def from_jobs_tags(cls, jobs_tags, jobs=None):
+        """Build the index of the jobs_tags mapping of job files to tags, the
+        ordinals of the given jobs list are kept."""
+        jobs = list(jobs or [])
+        known_jobs = set(jobs)
+        jobs.extend(sorted(j for j in jobs_tags if j not in known_jobs))
+        bitmaps = {}
+        for ordinal, job in enumerate(jobs):
+            for tag in jobs_tags.get(job, []):
+                bitmaps[tag] = bitmaps.get(tag, 0) | (1 << ordinal)
+        return cls(jobs, bitmaps)
+
+    def _term_bitmap(self, term):
+        bitmap = 0
+        for tag in term.split("|"):
+            bitmap |= self.bitmaps.get(tag.strip(), 0)
+        return bitmap
+
+    def select(self, tags):
+        """Return the bitmap of the jobs matching the tags expression."""
+        bitmap = self.all_jobs
+        for term in tags:
+            term = term.strip()
+            if not term:
+                continue
+            if term.startswith("!"):
+                bitmap &= ~self._term_bitmap(term[1:])
+            else:
+                bitmap &= self._term_bitmap(term)
+        return bitmap
+
+    def match(self, tags):
+        """Return the set of the job files matching the tags expression."""
+        bits = reversed(bin(self.select(tags))[2:])
+        return set(self.jobs[ordinal] for ordinal, bit in enumerate(bits) if bit == "1")
+
+    def to_dict(self):
+        return {
+            "jobs": self.jobs,
+            "tags": {tag: "%x" % bitmap for tag, bitmap in self.bitmaps.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bitmaps = {tag: int(bitmap, 16) for tag, bitmap in data["tags"].items()}
+        return cls(data["jobs"], bitmaps)
+
+
+def get_tags_index_path(working_dir, topic_name):
+    return "%s/%s" % (store.get_store_path(working_dir, topic_name), TAGS_INDEX_FILE)
+
+
+def _read(tags_index_path):
+    try:
+        with open(tags_index_path, "r") as f:
+            return TagsIndex.from_dict(json.loads(f.read()))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write(tags_index_path, tags_index):
+    os.makedirs(os.path.dirname(tags_index_path), exist_ok=True)
+    tmp_path = "%s.tmp" % tags_index_path
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(tags_index.to_dict()))
+    os.replace(tmp_path, tags_index_path)
+
+
+def update(working_dir, topic_name, jobs_tags):
+    """Rebuild the index from the whole jobs_tags mapping, the existing
+    jobs keep their ordinals."""
+    tags_index_path = get_tags_index_path(working_dir, topic_name)
+    tags_index = _read(tags_index_path)
+    jobs = tags_index.jobs if tags_index is not None else None
+    tags_index = TagsIndex.from_jobs_tags(jobs_tags, jobs)
+    try:
+        _write(tags_index_path, tags_index)
+    except OSError as e:
+        LOG.error("unable to write %s tags index: %s" % (topic_name, str(e)))
+    return tags_index
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load(working_dir, topic_name):
+    """Return the tags index of the topic, it is rebuilt from the tags log
+    when missing or older than it."""
+    tags_index_path = get_tags_index_path(working_dir, topic_name)
+    mtime = _get_mtime(tags_index_path)
+    tags_mtime = tags_log.get_mtime(working_dir, topic_name)
+    with _INDEXES_LOCK:
+        loaded = _INDEXES.get(tags_index_path)
+        if loaded is not None and loaded[0] == (mtime, tags_mtime):
+            return loaded[1]
+        tags_index = None
+        if mtime is not None and (tags_mtime or 0) <= mtime:
+            tags_index = _read(tags_index_path)
+        if tags_index is None:
+            LOG.info("build %s tags index" % topic_name)
+            jobs_tags = tags_log.read(working_dir, topic_name)
+            tags_index = update(working_dir, topic_name, jobs_tags)
+            mtime = _get_mtime(tags_index_path)
+        _INDEXES[tags_index_path] = ((mtime, tags_mtime), tags_index)
+        return tags_index
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) Red Hat, Inc
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+# Append only log of the tags of the job files of a topic.
+#
+# TOPIC/store/tags.log has one json record per line, {"file": ..., "tags":
+# [...]} sets the tags of a job file and {"file": ..., "removed": true}
+# removes it, the last record of a file wins. The sync appends the records
+# of its new jobs with a single write, so its cost only depends on the
+# number of new jobs.
+#
+# Readers only replay the complete lines of the file, whatever the sync is
+# appending they get a consistent snapshot. The compaction rewrites the log
+# with one record per file in a temporary file which replaces the log, it
+# runs in a background thread once the log has enough superseded records.
+#
+# The log replaces TOPIC/index_tags.json, which is read as long as the
+# topic has no log and is migrated by the first append.
+
+import fcntl
+import json
+import logging
+import os
+import sys
+import threading
+
+from dci_analysis import store
+
+
+LOG = logging.getLogger(__name__)
+
+formatter = logging.Formatter("%(levelname)s - %(message)s")
+streamhandler = logging.StreamHandler(stream=sys.stdout)
+streamhandler.setFormatter(formatter)
+LOG.addHandler(streamhandler)
+LOG.setLevel(logging.DEBUG)
+
+TAGS_LOG_FILE = "tags.log"
+
+# the log is compacted when it has more than this ratio of records per file
+COMPACTION_RATIO = 2
+
+
+def get_tags_log_path(working_dir, topic_name):
+    return "%s/%s" % (store.get_store_path(working_dir, topic_name), TAGS_LOG_FILE)
+
+
+def get_index_tags_path(working_dir, topic_name):
+    return "%s/%s/index_tags.json" % (working_dir, topic_name)
+
+
+def get_mtime(working_dir, topic_name):
+    """Return the modification time of the tags of the topic, the log or
+    the legacy index_tags.json, None if the topic has no tags."""
+    for path in (
+        get_tags_log_path(working_dir, topic_name),
+        get_index_tags_path(working_dir, topic_name),
+    ):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+    return None
+
+
+def _replay(data, jobs_tags=None):
+    """Apply the complete records of the log data, return the jobs tags and
+    the number of records."""
+    jobs_tags = {} if jobs_tags is None else jobs_tags
+    nb_records = 0
+    # a trailing line without its newline is being appended, it is skipped
+    for line in data[: data.rfind(b"\n") + 1].splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            LOG.error("skip corrupted tags record: %s" % line[:80])
+            continue
+        nb_records += 1
+        if record.get("removed"):
+            jobs_tags.pop(record["file"], None)
+        else:
+            jobs_tags[record["file"]] = record["tags"]
+    return jobs_tags, nb_records
+
+
+def _read_legacy(working_dir, topic_name):
+    index_tags_path = get_index_tags_path(working_dir, topic_name)
+    if not os.path.exists(index_tags_path):
+        return {}
+    with open(index_tags_path, "r") as f:
+        return json.loads(f.read())
+
+
+def _read(tags_log_path):
+    with open(tags_log_path, "rb") as f:
+        return _replay(f.read())
+
+
+def read(working_dir, topic_name):
+    """Return the mapping of the job files of the topic to their tags."""
+    try:
+        return _read(get_tags_log_path(working_dir, topic_name))[0]
+    except FileNotFoundError:
+        return _read_legacy(working_dir, topic_name)
+
+
+def _to_records(jobs_tags, removed_files=()):
+    lines = [json.dumps({"file": f, "tags": t}) for f, t in jobs_tags.items()]
+    lines.extend(json.dumps({"file": f, "removed": True}) for f in removed_files)
+    return "".join("%s\n" % line for line in lines).encode("utf-8")
+
+
+class _Lock(object):
+    """Lock of the writers of the log, between threads and processes."""
+
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, tags_log_path):
+        self.lock_path = "%s.lock" % tags_log_path
+        with self._locks_lock:
+            self.lock = self._locks.setdefault(self.lock_path, threading.Lock())
+
+    def __enter__(self):
+        self.lock.acquire()
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self.fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.lock.release()
+
+
+def _write(tags_log_path, jobs_tags):
+    tmp_path = "%s.tmp" % tags_log_path
+    with open(tmp_path, "wb") as f:
+        f.write(_to_records(jobs_tags))
+    os.replace(tmp_path, tags_log_path)
+
+
+def append(working_dir, topic_name, jobs_tags, removed_files=()):
+    """Append the tags of the job files and the removed files to the log in
+    one batch."""
+    if not jobs_tags and not removed_files:
+        return
+    tags_log_path = get_tags_log_path(working_dir, topic_name)
+    with _Lock(tags_log_path):
+        if not os.path.exists(tags_log_path):
+            legacy_jobs_tags = _read_legacy(working_dir, topic_name)
+            if legacy_jobs_tags:
+                LOG.info("migrate %s index_tags.json to the tags log" % topic_name)
+            _write(tags_log_path, legacy_jobs_tags)
+        fd = os.open(tags_log_path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, _to_records(jobs_tags, removed_files))
+        finally:
+            os.close(fd)
+
+
+def compact(working_dir, topic_name):
+    """Rewrite the log with one record per job file, return True if it was
+    compacted."""
+    tags_log_path = get_tags_log_path(working_dir, topic_name)
+    with _Lock(tags_log_path):
+        try:
+            jobs_tags, nb_records = _read(tags_log_path)
+        except FileNotFoundError:
+            return False
+        if nb_records <= max(len(jobs_tags), 1) * COMPACTION_RATIO:
+            return False
+        LOG.info(
+            "compact %s tags log from %s to %s records"
+            % (topic_name, nb_records, len(jobs_tags))
+        )
+        _write(tags_log_path, jobs_tags)
+        return True
+
+
+def compact_in_background(working_dir, topic_name):
+    """Compact the log in a thread, the interpreter waits for it at exit."""
+
+    def _compact():
+        try:
+            compact(working_dir, topic_name)
+        except Exception:
+            LOG.exception("failed to compact %s tags log" % topic_name)
+
+    thread = threading.Thread(target=_compact, name="compact-%s" % topic_name)
+    thread.start()
+    return thread
@@ -24,6 +24,9 @@ import os
 import pandas as pd
 import sys
 
+from dci_analysis import loader
+from dci_analysis import store
+
 
 def get_sorted_csv_files(csv_files, topic_name):
     sorted_csv_files = []
@@ -41,30 +44,38 @@ def get_sorted_csv_files(csv_files, topic_name):
 
 
 def get_jobs_dataset(topic_name):
-    csv_files = glob.glob("%s/*" % topic_name)
+    csv_files = glob.glob("%s/*.csv" % topic_name)
     sorted_csv_files = get_sorted_csv_files(csv_files, topic_name)
-    first_csf_file, csv_files = sorted_csv_files[0], sorted_csv_files[1:]
-    abs_path_cf = os.path.abspath(first_csf_file)
-    jobs_dataset = pd.read_csv(
-        abs_path_cf, delimiter=",", engine="python", index_col="testname"
-    )  # noqa
-
-    for cf in csv_files:
-        abs_path_cf = os.path.abspath(cf)
-        df = pd.read_csv(
-            abs_path_cf, delimiter=",", engine="python", index_col="testname"
-        )  # noqa
-        jobs_dataset = jobs_dataset.merge(df, left_on="testname", right_on="testname")
+    abs_path_csv_files = [os.path.abspath(cf) for cf in sorted_csv_files]
+    jobs_dataset, _, _ = loader.read_csv_files(abs_path_csv_files)
     return jobs_dataset
 
 
-def dashit(topic_name, testcase_name):
+def get_testcase_series(topic_name, testcase_name):
+    """Return the timings of the testcase per job id, read from the row of
+    the topic store, or from the csv files without a store."""
+    topic_path = os.path.abspath(topic_name)
+    working_dir, topic = os.path.dirname(topic_path), os.path.basename(topic_path)
+    store_jobs = store.get_jobs(working_dir, topic)
+    if store_jobs is not None:
+        timings = store.read_test(working_dir, topic, testcase_name)
+        if timings is None or len(timings) != len(store_jobs):
+            return None
+        testcase_series = pd.Series(timings, index=[j["id"] for j in store_jobs])
+        return testcase_series.dropna()
+
     job_dataset = get_jobs_dataset(topic_name)
     if testcase_name not in set(job_dataset.index.values):
+        return None
+    return job_dataset.loc[testcase_name]
+
+
+def dashit(topic_name, testcase_name):
+    testcase_series = get_testcase_series(topic_name, testcase_name)
+    if testcase_series is None:
         print("%s not in topic %s" % (testcase_name, topic_name))
         sys.exit(1)
 
-    testcase_series = job_dataset.loc[testcase_name]
     app = dash.Dash()
     app.layout = html.Div(
         children=[